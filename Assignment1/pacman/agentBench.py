@@ -0,0 +1,171 @@
+# agentBench.py
+# -------------
+# Benchmarks pacman agents against each other: how well they play, and
+# what it costs them.
+#
+# Every (agent, forward model budget, layout, seed) combination is played as
+# one headless game, each in a fresh worker process, so that no earlier
+# game's peak hides this one's.  Per agent, budget and layout the
+# comparison table shows the score and win rate next to the getAction
+# latency percentiles, the forward model calls granted per move (and those
+# refused once the budget ran out) and how much the game grew the worker's
+# peak memory, so an agent that wins by being slow stands out from one that
+# wins by being smart.
+
+"""
+USAGE:      python agentBench.py <options>
+EXAMPLES:   (1) python agentBench.py -p BFSAgent,DFSAgent,AStarAgent -l mediumClassic,smallClassic
+                - 5 seeds of each agent on both layouts
+            (2) python agentBench.py -p BFSAgent,AStarAgent -i 100,500 -s 10 -o bench-agents.json
+                - every agent at two budgets, the results also written to JSON
+"""
+
+import sys, time, random, json
+import pacman, textDisplay, tracer
+from pacman import default
+from harness import addLatency, muteWorker, loadLayout, listLayouts, playGames, printProgress, summarizeGames, printTable
+
+def peakMemory():
+    "The process's peak resident memory in MB, or None where it is unknown."
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+    if sys.platform == 'darwin': return peak / 1024.0 / 1024.0 # Bytes on OS X, KB elsewhere
+    return peak / 1024.0
+
+#################
+# Worker side   #
+#################
+
+_WORKER_OPTIONS = None
+
+def _initWorker( options ):
+    global _WORKER_OPTIONS
+    _WORKER_OPTIONS = options
+    muteWorker()
+
+def _playGame( job ):
+    """
+    Plays one (agent, iterations, layout, seed) game and returns its result
+    row.  A crash is recorded in the row rather than raised.
+    """
+    agentName, iterations, layoutName, seed = job
+    options = _WORKER_OPTIONS
+    row = {'agent': agentName, 'iterations': iterations, 'layout': layoutName, 'seed': seed,
+           'score': 0.0, 'win': False, 'crashed': False, 'latencies': {}, 'forwardCalls': 0,
+           'refusedCalls': 0, 'memoryGrowth': None, 'time': 0.0}
+    start = time.time()
+    try:
+        random.seed( seed )
+        board = loadLayout( layoutName, options['layoutDir'] )
+        agent = pacman.loadAgent( agentName, True )()
+        ghostType = pacman.loadAgent( options['ghost'], True )
+        ghosts = [ghostType( i+1 ) for i in range( options['numGhosts'] )]
+        rules = pacman.ClassicGameRules( options['timeout'], options['moveTimeout'], None, iterations, options['timeout'] )
+        game = rules.newGame( board, agent, ghosts, textDisplay.NullGraphics(), True, options['catchExceptions'] )
+        game.tracer = tracer.Tracer()
+        baseline = peakMemory()
+        game.run()
+        if baseline != None: row['memoryGrowth'] = peakMemory() - baseline
+        row['score'] = game.state.getScore()
+        row['win'] = game.state.isWin()
+        row['crashed'] = game.agentCrashed
+        for event in game.trace.events:
+            if event['tid'] == 0 and event['name'] == 'getAction':
+                addLatency( row['latencies'], event['dur'] / 1e6 )
+        row['forwardCalls'] = sum( [granted for granted, spent, limit in game.simulationReports] )
+        row['refusedCalls'] = sum( [spent - granted for granted, spent, limit in game.simulationReports] )
+    except Exception, e:
+        row['crashed'] = True
+        row['error'] = '%s: %s' % (e.__class__.__name__, e)
+    row['time'] = time.time() - start
+    return row
+
+#################
+# Driver side   #
+#################
+
+def runBenchmark( agents, budgets, layouts, seeds, options, workers ):
+    """
+    Plays every game, each in a new worker process, and returns the rows.
+    """
+    jobs = [(a, i, l, s) for a in agents for i in budgets for l in layouts for s in seeds]
+    print 'Benchmark: %d games on %d workers' % (len( jobs ), workers)
+    rows = []
+    def onRow( i, row ):
+        rows.append( row )
+        printProgress( i, len( jobs ), '%s -i %d on %s (seed %d)' % (row['agent'], row['iterations'], row['layout'], row['seed']), row )
+    playGames( _playGame, jobs, workers, _initWorker, (options,), onRow, maxtasksperchild=1 )
+    return rows
+
+def summarize( rows ):
+    """
+    Aggregates result rows into one entry per (agent, iterations, layout).
+    """
+    table = []
+    for entry, group in summarizeGames( rows, ['agent', 'iterations', 'layout'] ):
+        moves = max( entry['moves'], 1 )
+        memory = [row['memoryGrowth'] for row in group if row['memoryGrowth'] != None]
+        if len( memory ) == 0: memory = [0.0]
+        entry['memoryGrowth'] = max( memory )
+        entry['callsPerMove'] = sum( [row['forwardCalls'] for row in group] ) / float( moves )
+        entry['refusedPerMove'] = sum( [row['refusedCalls'] for row in group] ) / float( moves )
+        table.append( entry )
+    return table
+
+COLUMNS = [('agent', '%-20s', '%-20s'), ('iterations', '%10s', '%10d'), ('layout', '%-18s', '%-18s'),
+           ('games', '%6s', '%6d'), ('meanScore', '%10s', '%10.1f'), ('winRate', '%8s', '%8.2f'),
+           ('crashes', '%8s', '%8d'), ('p50', '%9s', '%9.2f'), ('p95', '%9s', '%9.2f'), ('p99', '%9s', '%9.2f'),
+           ('callsPerMove', '%13s', '%13.1f'), ('refusedPerMove', '%15s', '%15.1f'), ('memoryGrowth', '%13s', '%13.1f')]
+
+def readCommand( argv ):
+    from optparse import OptionParser
+    parser = OptionParser( __doc__ )
+    parser.add_option('-p', '--pacman', dest='pacman',
+                      help=default('Comma separated agent TYPEs from any *Agents.py to compare'), default='RandomAgent')
+    parser.add_option('-l', '--layouts', dest='layouts',
+                      help=default('Comma separated LAYOUTs, or "all" for every layout in the layout directory'), default='mediumClassic')
+    parser.add_option('--layoutDir', dest='layoutDir',
+                      help=default('Directory holding the .lay files'), default='layouts')
+    parser.add_option('-g', '--ghosts', dest='ghost',
+                      help=default('The ghost agent TYPE'), default='RandomGhost')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts',
+                      help=default('The maximum number of ghosts to use'), default=4)
+    parser.add_option('-s', '--seeds', type='int', dest='seeds',
+                      help=default('Number of seeds (games) per agent, budget and layout'), default=5)
+    parser.add_option('--firstSeed', type='int', dest='firstSeed',
+                      help=default('First seed; seeds are consecutive'), default=0)
+    parser.add_option('-i', '--iterations', dest='iterations',
+                      help=default('Comma separated forward model budgets (-i of pacman.py) to play each agent at'), default='500')
+    parser.add_option('--timeout', dest='timeout', type='float',
+                      help=default('Maximum length of time a game can last'), default=30)
+    parser.add_option('--moveTimeout', dest='moveTimeout', type='float',
+                      help='Maximum seconds an agent can spend on a single move with -c [Default: --timeout]', default=None)
+    parser.add_option('-c', '--catchExceptions', action='store_true', dest='catchExceptions',
+                      help='Turns on exception handling and timeouts during games', default=False)
+    parser.add_option('--workers', dest='workers', type='int',
+                      help=default('Number of worker processes'), default=4)
+    parser.add_option('-o', '--output', dest='output',
+                      help='JSON file to write the table and every game to', default=None)
+
+    options, otherjunk = parser.parse_args( argv )
+    if len( otherjunk ) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options, listLayouts( options.layouts, options.layoutDir )
+
+if __name__ == '__main__':
+    options, layouts = readCommand( sys.argv[1:] )
+    workerOptions = {'layoutDir': options.layoutDir, 'ghost': options.ghost, 'numGhosts': options.numGhosts,
+                     'timeout': options.timeout, 'moveTimeout': options.moveTimeout,
+                     'catchExceptions': options.catchExceptions}
+    seeds = range( options.firstSeed, options.firstSeed + options.seeds )
+    budgets = [int( i ) for i in options.iterations.split(',')]
+    rows = runBenchmark( options.pacman.split(','), budgets, layouts, seeds, workerOptions, options.workers )
+    table = summarize( rows )
+    printTable( table, COLUMNS, '   (latencies in ms, memory in MB)', ['p50', 'p95', 'p99'] )
+    if options.output != None:
+        f = open( options.output, 'w' )
+        try: json.dump( {'table': table, 'games': rows}, f, indent=1 )
+        finally: f.close()
@@ -0,0 +1,234 @@
+# agentHost.py
+# ------------
+# Runs agents in their own long-lived worker processes.
+#
+# A HostedAgent stands in for the real agent inside the Game.  The real agent
+# lives in a forked worker that keeps running from game to game; each call
+# sends it the state in the compact form of GameState.pack() over a pipe and
+# waits for its answer.  If the agent crashes, runs out of memory or times
+# out, the worker is killed and a fresh one is started on the next call, so
+# nothing an agent does can take down the process playing the games.
+#
+# The agent and the ghosts draw on one random number generator in a game
+# played in process.  Its state goes to the worker with every call and
+# comes back with the answer, so a seeded game plays out the same with
+# --isolate as without.
+#
+# An anytime agent (see game.Agent) stays one under --isolate: the worker
+# gets the time left on the move and the forward model calls left, and each
+# action it reports is sent back as it is found.  If the deadline fires
+# while the parent is waiting, the game plays the last reported action.
+
+"""
+USAGE:      python pacman.py -p MCTSAgent --isolate [--agentMemory 512] -c --moveTimeout 0.1
+"""
+
+import os, sys, signal, traceback, random, array
+from multiprocessing import Pipe
+from game import Agent
+from game import SimulationBudget, MoveBudget
+
+POLL_INTERVAL = 0.005 # Seconds between checks for a timeout while waiting on a worker
+
+def _randomState():
+    "The random module's state, with its 625 words packed into a string for the pipe."
+    version, words, gauss = random.getstate()
+    return (version, array.array( 'L', words ).tostring(), gauss)
+
+def _setRandomState( packed ):
+    version, words, gauss = packed
+    random.setstate( (version, tuple( array.array( 'L', words ) ), gauss) )
+
+class AgentProcessError(Exception):
+    """
+    The hosted agent raised an exception, ran out of memory or its worker
+    process died.
+    """
+    pass
+
+class AgentFactory:
+    """
+    Makes agents of agentType with the keyword arguments agentArgs, as the
+    makeAgent of a HostedAgent.
+    """
+    def __init__( self, agentType, agentArgs ):
+        self.agentType = agentType
+        self.agentArgs = agentArgs
+
+    def __call__( self ):
+        return self.agentType( **self.agentArgs )
+
+class _ReportingBudget( MoveBudget ):
+    "A worker's MoveBudget, which passes reported actions on to the parent."
+    def __init__( self, connection, seconds, simulations ):
+        MoveBudget.__init__( self, seconds, simulations )
+        self.connection = connection
+
+    def report( self, action ):
+        if action != self.bestAction:
+            self.connection.send( ('report', action) )
+        MoveBudget.report( self, action )
+
+class HostedAgent( Agent ):
+    """
+    Plays as the agent that makeAgent() creates, which lives in a worker
+    process.  maxMemory (megabytes) caps the worker's address space.
+
+    Workers are forked directly rather than through multiprocessing.Process,
+    so agents can be hosted from inside a multiprocessing pool worker
+    (--workers, tournament.py).  A timeout raised while waiting for the agent
+    kills its worker, as does any error; a new worker, with a new agent, is
+    started on the next call.
+
+    It has a getActionAnytime exactly when the agent type does.
+    """
+    def __init__( self, makeAgent, index=0, maxMemory=None ):
+        self.makeAgent = makeAgent
+        self.index = index
+        self.maxMemory = maxMemory
+        self.pid = None
+        self.connection = None
+        self.restarts = 0
+        if hasattr( getattr( makeAgent, 'agentType', makeAgent ), 'getActionAnytime' ):
+            self.getActionAnytime = self._getActionAnytime
+
+    def start( self ):
+        parentEnd, childEnd = Pipe()
+        pid = os.fork()
+        if pid == 0:
+            parentEnd.close()
+            status = 0
+            try:
+                _serve( childEnd, self.makeAgent, self.maxMemory )
+            except:
+                status = 1
+            os._exit( status )
+        childEnd.close()
+        self.pid = pid
+        self.connection = parentEnd
+
+    def stop( self ):
+        "Kills the worker, if there is one."
+        if self.pid == None: return
+        try:
+            os.kill( self.pid, signal.SIGKILL )
+        except OSError:
+            pass
+        os.waitpid( self.pid, 0 )
+        self.connection.close()
+        self.pid = None
+        self.connection = None
+        self.restarts += 1
+
+    def call( self, message, state, moveBudget=None ):
+        """
+        Sends message to the worker and returns the agent's answer, charging
+        the forward model calls the agent made to state.budget and taking
+        over the random state the agent left behind.  Actions the agent
+        reports on the way are passed to moveBudget.
+        """
+        if self.pid == None: self.start()
+        budget = state.budget
+        limit = None
+        if budget != None: limit = budget.remaining() + 1
+        try:
+            self.connection.send( message + (limit, _randomState()) )
+            while True:
+                while not self.connection.poll( POLL_INTERVAL ):
+                    pass
+                reply = self.connection.recv()
+                if reply[0] != 'report': break
+                moveBudget.report( reply[1] )
+            status, value, spent, granted, randomState = reply
+        except EOFError:
+            self.stop()
+            raise AgentProcessError( 'The agent process exited' )
+        except:
+            # Most likely a timeout: the worker is still busy with this call
+            self.stop()
+            raise
+        _setRandomState( randomState )
+        if budget != None: budget.add( spent, granted )
+        if status != 'ok':
+            self.stop()
+            raise AgentProcessError( value )
+        return value
+
+    def registerInitialState( self, state ):
+        numGhosts = state.getNumAgents() - 1
+        self.call( ('start', state.data.layout.layoutText, numGhosts, state.pack()), state )
+
+    def getAction( self, state ):
+        return self.call( ('move', state.pack()), state )
+
+    def _getActionAnytime( self, state, budget ):
+        seconds = budget.timeLeft()
+        if seconds == float('inf'): seconds = None
+        return self.call( ('anytime', state.pack(), seconds), state, budget )
+
+    def final( self, state ):
+        self.call( ('final', state.pack()), state )
+
+    def __del__( self ):
+        self.stop()
+
+def _serve( connection, makeAgent, maxMemory ):
+    """
+    The worker's loop: answers messages until the pipe is closed.
+    """
+    import layout
+    from pacman import GameState
+
+    if maxMemory != None:
+        try:
+            import resource
+            limit = maxMemory * 1024 * 1024
+            resource.setrlimit( resource.RLIMIT_AS, (limit, limit) )
+        except (ImportError, ValueError):
+            print >>sys.stderr, 'Could not limit the agent process memory'
+
+    agent = makeAgent()
+    initialStates = {}
+    initial = None
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        kind, limit, randomState = message[0], message[-2], message[-1]
+        _setRandomState( randomState )
+        budget = None
+        if limit != None: budget = SimulationBudget( limit )
+        try:
+            result = None
+            if kind == 'start':
+                layoutText, numGhosts, packed = message[1:4]
+                key = (tuple(layoutText), numGhosts)
+                if key not in initialStates:
+                    initial = GameState()
+                    initial.initialize( layout.Layout( layoutText ), numGhosts )
+                    initialStates[key] = initial
+                initial = initialStates[key]
+                state = initial.unpack( packed )
+                state.budget = budget
+                if 'registerInitialState' in dir( agent ):
+                    agent.registerInitialState( state )
+            else:
+                state = initial.unpack( message[1] )
+                state.budget = budget
+                if kind == 'move':
+                    result = agent.getAction( state )
+                elif kind == 'anytime':
+                    moveBudget = _ReportingBudget( connection, message[2], budget )
+                    result = agent.getActionAnytime( state, moveBudget )
+                elif 'final' in dir( agent ):
+                    agent.final( state )
+            reply = ('ok', result)
+        except MemoryError:
+            reply = ('error', 'The agent ran out of memory (limit %s MB)' % maxMemory)
+        except Exception:
+            reply = ('error', traceback.format_exc())
+        spent, granted = 0, 0
+        if budget != None: spent, granted = budget.spent, budget.granted
+        connection.send( reply + (spent, granted, _randomState()) )
+        if reply[0] != 'ok': return
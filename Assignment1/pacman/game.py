@@ -24,6 +24,8 @@ from util import *
 import time, os
 import traceback
 import sys
+import random
+import threading
 
 #######################
 # Parts worth reading #
@@ -35,7 +37,19 @@ class Agent:
     following methods which will be called if they exist:
 
     def registerInitialState(self, state): # inspects the starting state
+    def getActionAnytime(self, state, budget): # used instead of getAction
+
+    An anytime agent (one defining getActionAnytime) is handed a MoveBudget
+    and may keep searching until it runs out, calling budget.report(action)
+    whenever its best action changes.  If the move deadline fires before it
+    returns, the game plays the last reported action instead of timing the
+    agent out.  Returning None also plays the reported action.
+
+    Agents receive read-only views of the game state.  An agent that wants a
+    private copy it is free to modify can set mutableObservation = True.
     """
+    mutableObservation = False
+
     def __init__(self, index=0):
         self.index = index
 
@@ -46,6 +60,154 @@ class Agent:
         """
         raiseNotDefined()
 
+class SimulationBudget(object):
+    """
+    Counts forward model calls (generatePacmanSuccessor and apply) against a
+    limit.  Game.run gives every pacman move a fresh budget, which travels
+    with the observation and every state generated from it (state.budget).
+
+    charge() is thread safe, so parallel searches can share one budget.  A
+    worker can also be given a sub-budget, which has its own limit and draws
+    on its parent as well:
+
+      budgets = [state.budget.subBudget(250) for i in range(4)]
+    """
+    def __init__(self, limit, parent=None):
+        self.limit = limit
+        self.parent = parent
+        self.spent = 0   # calls made, including refused ones
+        self.granted = 0 # calls that returned a successor
+        self.lock = threading.Lock()
+
+    def charge(self):
+        """
+        Spends one forward model call and returns whether it may go ahead.
+        A limit of n allows n - 1 calls, as -i always has.
+        """
+        with self.lock:
+            self.spent += 1
+            if self.spent >= self.limit: return False
+        if self.parent != None and not self.parent.charge():
+            return False
+        with self.lock:
+            self.granted += 1
+        return True
+
+    def remaining(self):
+        "Calls that will still return a successor."
+        left = max(0, self.limit - self.spent - 1)
+        if self.parent != None: left = min(left, self.parent.remaining())
+        return left
+
+    def add(self, spent, granted):
+        "Charges calls that were made against a copy of this budget elsewhere."
+        with self.lock:
+            self.spent += spent
+            self.granted += granted
+        if self.parent != None: self.parent.add(spent, granted)
+
+    def subBudget(self, limit):
+        return SimulationBudget(limit, self)
+
+    def report(self):
+        "Accounting for the move: (calls granted, calls made, limit)."
+        return (self.granted, self.spent, self.limit)
+
+class MoveBudget:
+    """
+    What an agent may spend on one move: the wall clock time until the move
+    deadline (seconds on monotonicTime(); None means no deadline) and the
+    forward model calls left in its SimulationBudget (None means unlimited).
+    """
+    def __init__(self, seconds=None, simulations=None):
+        self.start = monotonicTime()
+        self.deadline = None
+        if seconds != None: self.deadline = self.start + seconds
+        self.simulations = simulations
+        self.bestAction = None
+
+    def timeLeft(self):
+        "Seconds until the deadline, or infinity without one."
+        if self.deadline == None: return float('inf')
+        return max(0.0, self.deadline - monotonicTime())
+
+    def callsLeft(self):
+        "Forward model calls that will still return a successor."
+        if self.simulations == None: return float('inf')
+        return self.simulations.remaining()
+
+    def expired(self):
+        return self.timeLeft() <= 0 or self.callsLeft() <= 0
+
+    def report(self, action):
+        "Records the best action found so far."
+        self.bestAction = action
+
+class OperationCounters:
+    """
+    Counts calls to the engine's hot methods (generateSuccessor, state and
+    Grid copies, hashing, getLegalActions), to compare agents by the work
+    they make the engine do rather than only by score.
+
+    Methods are registered with count(name, cls, method).  enable() swaps
+    them for counting versions and disable() puts the originals back, so
+    with counting off the engine runs exactly the code it always did.
+    Counts are kept per thread; snapshot() returns the calling thread's.
+    """
+    def __init__(self):
+        self.methods = []
+        self.originals = None
+        self.local = threading.local()
+
+    def count(self, name, cls, method):
+        self.methods.append((name, cls, method))
+        if self.originals != None: self._wrap(name, cls, method)
+
+    def enabled(self):
+        return self.originals != None
+
+    def enable(self):
+        if self.originals != None: return
+        self.originals = []
+        for name, cls, method in self.methods:
+            self._wrap(name, cls, method)
+
+    def disable(self):
+        if self.originals == None: return
+        for cls, method, original in self.originals:
+            setattr(cls, method, original)
+        self.originals = None
+
+    def _wrap(self, name, cls, method):
+        original = cls.__dict__[method]
+        counts = self.counts
+        def counted(*args, **keyArgs):
+            calls = counts()
+            calls[name] = calls.get(name, 0) + 1
+            return original(*args, **keyArgs)
+        counted.__name__ = original.__name__
+        counted.__doc__ = original.__doc__
+        self.originals.append((cls, method, original))
+        setattr(cls, method, counted)
+
+    def counts(self):
+        try:
+            return self.local.counts
+        except AttributeError:
+            self.local.counts = {}
+            return self.local.counts
+
+    def snapshot(self):
+        return dict(self.counts())
+
+    def since(self, before):
+        "The calls made since snapshot() returned before."
+        after = self.counts()
+        return dict([(name, calls - before.get(name, 0)) for name, calls in after.items()
+                     if calls != before.get(name, 0)])
+
+COUNTERS = OperationCounters()
+
 class Directions:
     NORTH = 'North'
     SOUTH = 'South'
@@ -67,18 +229,55 @@ class Directions:
                WEST: EAST,
                STOP: STOP}
 
-class Configuration:
+CONFIGURATION_CACHE = {}
+
+class Configuration(object):
     """
     A Configuration holds the (x,y) coordinate of a character, along with its
     traveling direction.
 
     The convention for positions, like a graph, is that (0,0) is the lower left corner, x increases
     horizontally and y increases vertically.  Therefore, north is the direction of increasing y, or (0,1).
+
+    Configurations are immutable.  Given a layout's intern table (see
+    getTable), Configuration(pos, direction, table) returns the one shared
+    instance for that pair on the layout; each instance caches the
+    successors it has generated, in the same table, so a move is a
+    dictionary lookup.  Positions are interned by type as well as value, so
+    pacman's (13, 3) and a ghost's (13.0, 3.0) stay different instances.
     """
+    __slots__ = ('pos', 'direction', '_hash', '_successors', '_table')
+
+    def __new__(cls, pos, direction, table=None):
+        if table is not None:
+            x, y = pos
+            key = (type(x), x, type(y), y, direction)
+            config = table.get(key)
+            if config is not None: return config
+        config = object.__new__(cls)
+        object.__setattr__(config, 'pos', pos)
+        object.__setattr__(config, 'direction', direction)
+        object.__setattr__(config, '_hash', hash(hash(pos) + 13 * hash(direction)))
+        object.__setattr__(config, '_successors', {})
+        object.__setattr__(config, '_table', table)
+        if table is not None: table[key] = config
+        return config
+
+    def getTable(layout):
+        """
+        Returns the intern table shared by every state played on this layout.
+        """
+        key = tuple(layout.layoutText)
+        if key not in CONFIGURATION_CACHE:
+            CONFIGURATION_CACHE[key] = {}
+        return CONFIGURATION_CACHE[key]
+    getTable = staticmethod(getTable)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Configurations are immutable')
 
-    def __init__(self, pos, direction):
-        self.pos = pos
-        self.direction = direction
+    def __reduce__(self):
+        return (Configuration, (self.pos, self.direction))
 
     def getPosition(self):
         return (self.pos)
@@ -91,13 +290,15 @@ class Configuration:
         return x == int(x) and y == int(y)
 
     def __eq__(self, other):
+        if self is other: return True
         if other == None: return False
         return (self.pos == other.pos and self.direction == other.direction)
 
+    def __ne__(self, other):
+        return not self == other
+
     def __hash__(self):
-        x = hash(self.pos)
-        y = hash(self.direction)
-        return hash(x + 13 * y)
+        return self._hash
 
     def __str__(self):
         return "(x,y)="+str(self.pos)+", "+str(self.direction)
@@ -110,17 +311,26 @@ class Configuration:
 
         Actions are movement vectors.
         """
-        x, y= self.pos
         dx, dy = vector
-        direction = Actions.vectorToDirection(vector)
-        if direction == Directions.STOP:
-            direction = self.direction # There is no stop direction
-        return Configuration((x + dx, y+dy), direction)
-
-class AgentState:
+        key = (type(dx), dx, type(dy), dy)
+        successor = self._successors.get(key)
+        if successor is None:
+            x, y= self.pos
+            direction = Actions.vectorToDirection(vector)
+            if direction == Directions.STOP:
+                direction = self.direction # There is no stop direction
+            successor = self._successors[key] = Configuration((x + dx, y+dy), direction, self._table)
+        return successor
+
+    def moveTo(self, pos):
+        "Returns the configuration at pos with the same direction, on the same layout."
+        return Configuration(pos, self.direction, self._table)
+
+class AgentState(object):
     """
     AgentStates hold the state of an agent (configuration, speed, scared, etc).
     """
+    __slots__ = ('start', 'configuration', 'isPacman', 'scaredTimer', 'numCarrying', 'numReturned')
 
     def __init__( self, startConfiguration, isPacman ):
         self.start = startConfiguration
@@ -141,12 +351,24 @@ class AgentState:
             return False
         return self.configuration == other.configuration and self.scaredTimer == other.scaredTimer
 
+    def __ne__( self, other ):
+        return not self == other
+
     def __hash__(self):
         return hash(hash(self.configuration) + 13 * hash(self.scaredTimer))
 
+    def __getstate__( self ):
+        return tuple([getattr(self, name) for name in AgentState.__slots__])
+
+    def __setstate__( self, values ):
+        for name, value in zip(AgentState.__slots__, values):
+            setattr(self, name, value)
+
     def copy( self ):
-        state = AgentState( self.start, self.isPacman )
+        state = AgentState.__new__( AgentState )
+        state.start = self.start
         state.configuration = self.configuration
+        state.isPacman = self.isPacman
         state.scaredTimer = self.scaredTimer
         state.numCarrying = self.numCarrying
         state.numReturned = self.numReturned
@@ -183,6 +405,10 @@ class Grid:
     def __setitem__(self, key, item):
         self.data[key] = item
 
+    def isSet(self, x, y):
+        "Returns grid[x][y]; the fast way to read one cell of a BitGrid."
+        return self.data[x][y]
+
     def __str__(self):
         out = [[str(self.data[x][y])[0] for x in range(self.width)] for y in range(self.height)]
         out.reverse()
@@ -190,6 +416,7 @@ class Grid:
 
     def __eq__(self, other):
         if other == None: return False
+        if isinstance(other, BitGrid): return other == self
         return self.data == other.data
 
     def __hash__(self):
@@ -280,6 +507,157 @@ def reconstituteGrid(bitRep):
     width, height = bitRep[:2]
     return Grid(width, height, bitRepresentation= bitRep[2:])
 
+class BitGrid(Grid):
+    """
+    A Grid of booleans packed into a single integer bitmask, one bit per cell.
+
+    Cell (x,y) lives at bit x * height + y, which is the same cell order that
+    Grid.__hash__ uses, so a BitGrid hashes equal to a Grid with the same
+    contents.  Reads and writes keep the grid[x][y] API; count() is a
+    popcount, copy() copies one int and __hash__ hashes one int.
+
+    grid[x][y] goes through a column view, which costs several times a list
+    lookup; isSet(x, y) reads the bit directly and is what hot paths use.
+    """
+    def __init__(self, width, height, initialValue=False, bits=0):
+        if initialValue not in [False, True]: raise Exception('Grids can only contain booleans')
+        self.CELLS_PER_INT = 30
+
+        self.width = width
+        self.height = height
+        if initialValue:
+            bits = (1 << (width * height)) - 1
+        self.bits = bits
+
+    def fromGrid(grid):
+        """
+        Builds a BitGrid holding the same cells as any grid-like object.
+        """
+        bits = 0
+        i = 0
+        for x in range(grid.width):
+            for y in range(grid.height):
+                if grid[x][y]:
+                    bits |= 1 << i
+                i += 1
+        return BitGrid(grid.width, grid.height, bits=bits)
+    fromGrid = staticmethod(fromGrid)
+
+    def __getitem__(self, x):
+        if x < 0: x += self.width
+        if x < 0 or x >= self.width: raise IndexError('grid column out of range')
+        return _BitColumn(self, x)
+
+    def isSet(self, x, y):
+        return (self.bits >> (x * self.height + y)) & 1 == 1
+
+    def __setitem__(self, x, column):
+        offset = x * self.height
+        for y in range(self.height):
+            if column[y]:
+                self.bits |= 1 << (offset + y)
+            else:
+                self.bits &= ~(1 << (offset + y))
+
+    def __iter__(self):
+        for x in range(self.width):
+            yield _BitColumn(self, x)
+
+    def __len__(self):
+        return self.width
+
+    def __str__(self):
+        out = [[str(self[x][y])[0] for x in range(self.width)] for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if other == None: return False
+        if isinstance(other, BitGrid):
+            return self.bits == other.bits and self.width == other.width and self.height == other.height
+        if isinstance(other, Grid):
+            return self.bits == BitGrid.fromGrid(other).bits
+        return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def copy(self):
+        return BitGrid(self.width, self.height, bits=self.bits)
+
+    def deepCopy(self):
+        return self.copy()
+
+    def shallowCopy(self):
+        # The bitmask is an immutable int, so sharing it is already a copy
+        return self.copy()
+
+    def count(self, item =True ):
+        n = bin(self.bits).count('1')
+        if item: return n
+        return self.width * self.height - n
+
+    def asList(self, key = True):
+        list = []
+        bits = self.bits
+        if not key:
+            bits = ~bits & ((1 << (self.width * self.height)) - 1)
+        height = self.height
+        i = 0
+        while bits:
+            if bits & 1:
+                list.append( (i / height, i % height) )
+            bits >>= 1
+            i += 1
+        return list
+
+    def toGrid(self):
+        """
+        Returns an equivalent list-of-lists Grid.
+        """
+        g = Grid(self.width, self.height)
+        for x, y in self.asList():
+            g.data[x][y] = True
+        return g
+
+class _BitColumn(object):
+    """
+    A view of one column of a BitGrid, so that grid[x][y] keeps working.
+    """
+    __slots__ = ('grid', 'offset', 'height')
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.offset = x * grid.height
+        self.height = grid.height
+
+    def __getitem__(self, y):
+        if y < 0: y += self.height
+        if y < 0 or y >= self.height: raise IndexError('grid row out of range')
+        return (self.grid.bits >> (self.offset + y)) & 1 == 1
+
+    def __setitem__(self, y, value):
+        if y < 0: y += self.height
+        if y < 0 or y >= self.height: raise IndexError('grid row out of range')
+        if value:
+            self.grid.bits |= 1 << (self.offset + y)
+        else:
+            self.grid.bits &= ~(1 << (self.offset + y))
+
+    def __len__(self):
+        return self.height
+
+    def __iter__(self):
+        bits = self.grid.bits >> self.offset
+        for y in range(self.height):
+            yield (bits >> y) & 1 == 1
+
+    def count(self, item=True):
+        return [cell for cell in self].count(item)
+
 ####################################
 # Parts you shouldn't have to read #
 ####################################
@@ -368,6 +746,78 @@ class Actions:
         return (x + dx, y + dy)
     getSuccessor = staticmethod(getSuccessor)
 
+ZOBRIST_CACHE = {}
+ZOBRIST_LOCK = threading.Lock()
+
+class ZobristTable:
+    """
+    Random 64-bit keys for the pieces of a game state on one layout.
+
+    A state's hash key is the XOR of the keys of its food cells, its capsules
+    and its agents' (position, direction, scared timer), so a move only has to
+    XOR the changed pieces in and out.  Keys are drawn lazily from a private,
+    fixed-seed generator so that the global random stream is untouched.
+
+    Games on several threads share a table.  A key is drawn under a lock,
+    so every thread sees the same key for a piece; reading a key that is
+    already drawn takes no lock.
+    """
+    SEED = 6613
+
+    def __init__(self):
+        self._random = random.Random(ZobristTable.SEED)
+        self._lock = threading.Lock()
+        self._foodKeys = {}
+        self._capsuleKeys = {}
+        self._agentKeys = {}
+
+    def getTable(layout):
+        """
+        Returns the table shared by every state played on this layout.
+        """
+        key = tuple(layout.layoutText)
+        table = ZOBRIST_CACHE.get(key)
+        if table is None:
+            with ZOBRIST_LOCK:
+                table = ZOBRIST_CACHE.get(key)
+                if table is None:
+                    table = ZOBRIST_CACHE[key] = ZobristTable()
+        return table
+    getTable = staticmethod(getTable)
+
+    def _draw(self, keys, key):
+        value = keys.get(key)
+        if value is None:
+            with self._lock:
+                value = keys.get(key)
+                if value is None:
+                    value = keys[key] = self._random.getrandbits(64)
+        return value
+
+    def foodKey(self, position):
+        return self._draw(self._foodKeys, position)
+
+    def capsuleKey(self, position):
+        return self._draw(self._capsuleKeys, position)
+
+    def agentKey(self, agentIndex, agentState):
+        conf = agentState.configuration
+        if conf == None: return 0
+        return self._draw(self._agentKeys, (agentIndex, conf.pos, conf.direction, agentState.scaredTimer))
+
+    def hashKey(self, data):
+        """
+        Computes the hash key of a GameStateData from scratch.
+        """
+        h = 0
+        for position in data.food.asList():
+            h ^= self.foodKey(position)
+        for position in data.capsules:
+            h ^= self.capsuleKey(position)
+        for index, agentState in enumerate(data.agentStates):
+            h ^= self.agentKey(index, agentState)
+        return h
+
 class GameStateData:
     """
 
@@ -377,12 +827,19 @@ class GameStateData:
         Generates a new data packet by copying information from its predecessor.
         """
         if prevState != None:
+            # Food, capsules and agent states are shared with the predecessor
+            # and copied on first write (see writableAgentState/writableCapsules)
             self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates( prevState.agentStates )
+            self.capsules = prevState.capsules
+            self._capsulesCopied = False
+            self.agentStates = prevState.agentStates
+            self._agentsCopied = None
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self._zobrist = prevState._zobrist
+            self._hashKey = prevState._hashKey
+            self.numFood = prevState.numFood
 
         self._foodEaten = None
         self._foodAdded = None
@@ -391,11 +848,15 @@ class GameStateData:
         self._lose = False
         self._win = False
         self.scoreChange = 0
+        self.frozen = False
 
     def deepCopy( self ):
         state = GameStateData( self )
         state.food = self.food.deepCopy()
-        state.layout = self.layout.deepCopy()
+        state.capsules = self.capsules[:]
+        state._capsulesCopied = True
+        state.agentStates = self.copyAgentStates( self.agentStates )
+        state._agentsCopied = [True for a in state.agentStates]
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
         state._foodAdded = self._foodAdded
@@ -408,6 +869,55 @@ class GameStateData:
             copiedStates.append( agentState.copy() )
         return copiedStates
 
+    def writableAgentState( self, agentIndex ):
+        """
+        Returns the AgentState of agentIndex for modification, first copying
+        it if it is still shared with the predecessor state.
+        """
+        copied = self._agentsCopied
+        if copied is None:
+            self.agentStates = self.agentStates[:]
+            copied = self._agentsCopied = [False for a in self.agentStates]
+        if not copied[agentIndex]:
+            self.agentStates[agentIndex] = self.agentStates[agentIndex].copy()
+            copied[agentIndex] = True
+        return self.agentStates[agentIndex]
+
+    def writableCapsules( self ):
+        """
+        Returns the capsule list for modification, first copying it if it is
+        still shared with the predecessor state.
+        """
+        if not self._capsulesCopied:
+            self.capsules = self.capsules[:]
+            self._capsulesCopied = True
+        return self.capsules
+
+    def saveStep( self ):
+        """
+        Returns an undo record for an in-place step (see GameState.apply).
+
+        The agent state list and capsule list are marked as shared again, so
+        the rules copy whatever they change on first write and the record
+        only has to keep references to the current objects.
+        """
+        record = (self.food, self.numFood, self.capsules, self._capsulesCopied,
+                  self.agentStates, self._agentsCopied, self._eaten, self.score,
+                  self.scoreChange, self._win, self._lose, self._foodEaten,
+                  self._foodAdded, self._capsuleEaten, self._agentMoved, self._hashKey)
+        self._capsulesCopied = False
+        self._agentsCopied = None
+        return record
+
+    def restoreStep( self, record ):
+        """
+        Puts back everything saved by saveStep.
+        """
+        (self.food, self.numFood, self.capsules, self._capsulesCopied,
+         self.agentStates, self._agentsCopied, self._eaten, self.score,
+         self.scoreChange, self._win, self._lose, self._foodEaten,
+         self._foodAdded, self._capsuleEaten, self._agentMoved, self._hashKey) = record
+
     def __eq__( self, other ):
         """
         Allows two states to be compared.
@@ -423,14 +933,35 @@ class GameStateData:
     def __hash__( self ):
         """
         Allows states to be keys of dictionaries.
+
+        The Zobrist key is maintained incrementally by the game rules, so
+        hashing costs O(1) instead of a walk over the board and agents.
         """
-        for i, state in enumerate( self.agentStates ):
-            try:
-                int(hash(state))
-            except TypeError, e:
-                print e
-                #hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113* hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575 )
+        if self._hashKey is None:
+            self._hashKey = self._zobrist.hashKey(self)
+        return hash((self._hashKey, self.score))
+
+    def toggleFoodKey( self, position ):
+        """
+        XORs a food cell into (or out of) the state's hash key.
+        """
+        if self._hashKey is not None:
+            self._hashKey ^= self._zobrist.foodKey(position)
+
+    def toggleCapsuleKey( self, position ):
+        """
+        XORs a capsule into (or out of) the state's hash key.
+        """
+        if self._hashKey is not None:
+            self._hashKey ^= self._zobrist.capsuleKey(position)
+
+    def toggleAgentKey( self, agentIndex ):
+        """
+        XORs an agent's current state into (or out of) the state's hash key.
+        Call it once before and once after changing the agent.
+        """
+        if self._hashKey is not None:
+            self._hashKey ^= self._zobrist.agentKey(agentIndex, self.agentStates[agentIndex])
 
     def __str__( self ):
         width, height = self.layout.width, self.layout.height
@@ -489,20 +1020,33 @@ class GameStateData:
         Creates an initial game state from a layout array (see layout.py).
         """
         self.food = layout.food.copy()
+        self.numFood = layout.totalFood
         #self.capsules = []
         self.capsules = layout.capsules[:]
+        self._capsulesCopied = True
         self.layout = layout
         self.score = 0
         self.scoreChange = 0
 
         self.agentStates = []
+        configurations = Configuration.getTable(layout)
         numGhosts = 0
         for isPacman, pos in layout.agentPositions:
             if not isPacman:
                 if numGhosts == numGhostAgents: continue # Max ghosts reached already
                 else: numGhosts += 1
-            self.agentStates.append( AgentState( Configuration( pos, Directions.STOP), isPacman) )
+            self.agentStates.append( AgentState( Configuration( pos, Directions.STOP, configurations ), isPacman) )
         self._eaten = [False for a in self.agentStates]
+        self._agentsCopied = [True for a in self.agentStates]
+        self._zobrist = ZobristTable.getTable(layout)
+        self._hashKey = self._zobrist.hashKey(self)
+
+COUNTERS.count('GameStateData', GameStateData, '__init__')
+COUNTERS.count('GameStateData.deepCopy', GameStateData, 'deepCopy')
+COUNTERS.count('Grid.copy', Grid, 'copy')
+COUNTERS.count('Grid.copy', BitGrid, 'copy')
+COUNTERS.count('Grid.__hash__', Grid, '__hash__')
+COUNTERS.count('Grid.__hash__', BitGrid, '__hash__')
 
 try:
     import boinc
@@ -513,16 +1057,32 @@ except:
 class Game:
     """
     The Game manages the control flow, soliciting actions from agents.
+
+    Everything a game reads or records lives on the instance, so any number
+    of games can run at once in one process:
+
+      maxIterations   forward model calls per pacman move
+      timeLimit       wall clock seconds the whole game may take
+      fileName        if set, pacman's moves are written there after the game
+      movementHistory pacman's moves, once the game is over
+      notLossButTime  whether the game ended before timeLimit ran out
+
+    With muteAgents, what each agent prints is kept in agentOutput, up to
+    outputLimit bytes per agent (the latest output wins), and if outputLog
+    names a file, all of it is written there as well.
+
+    A tracer.Tracer, if given, records the game move by move in trace.
+    While COUNTERS are enabled, operationCounts totals for each agent the
+    engine calls its getAction made, over countedMoves moves.
     """
-    currentIterations=1000
-    maxIterations=1000
-    timeLimit=30
-    totalFoodAndCapsules=0
-    movementHistory=[]
-    notLossButTime = False
-    fileName=""
-
-    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False ):
+    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False,
+                  maxIterations=1000, timeLimit=30, outputLimit=1 << 16, outputLog=None, tracer=None ):
+        self.maxIterations = maxIterations
+        self.timeLimit = timeLimit
+        self.fileName = ""
+        self.totalFoodAndCapsules = 0
+        self.movementHistory = []
+        self.notLossButTime = False
         self.agentCrashed = False
         self.agents = agents
         self.display = display
@@ -532,11 +1092,31 @@ class Game:
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
         self.moveHistory = []
+        self.simulationReports = []
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
         self.agentTimeout = False
-        import cStringIO
-        self.agentOutput = [cStringIO.StringIO() for agent in agents]
+        self.outputLog = outputLog
+        self.outputLogFile = None
+        self.agentOutput = [OutputBuffer(outputLimit) for agent in agents]
+        self.tracer = tracer
+        self.trace = None
+        self.operationCounts = None
+        self.countedMoves = None
+
+    def observe( self, agentIndex, simulations=None ):
+        """
+        Returns the state as agentIndex should see it: a read-only view that
+        shares what it can with the real state, or a full private copy for agents
+        that set mutableObservation.  Forward model calls made from it are
+        charged to simulations.
+        """
+        if getattr(self.agents[agentIndex], 'mutableObservation', False) or not hasattr(self.state, 'makeObservation'):
+            observation = self.state.deepCopy()
+        else:
+            observation = self.state.makeObservation(agentIndex)
+        observation.budget = simulations
+        return observation
 
     def getProgress(self):
         if self.gameOver:
@@ -544,6 +1124,17 @@ class Game:
         else:
             return self.rules.getProgress(self)
 
+    def requestAction( self, agent, observation, budget ):
+        """
+        Asks agent for its move, through getActionAnytime when it has a budget.
+        """
+        if budget == None:
+            return agent.getAction( observation )
+        action = agent.getActionAnytime( observation, budget )
+        if action == None:
+            action = budget.bestAction
+        return action
+
     def _agentCrash( self, agentIndex, quiet=False):
         "Helper method for handling agent crashes"
         if not quiet: traceback.print_exc()
@@ -551,177 +1142,399 @@ class Game:
         self.agentCrashed = True
         self.rules.agentCrash(self, agentIndex)
 
-    OLD_STDOUT = None
-    OLD_STDERR = None
-
     def mute(self, agentIndex):
+        "Captures what this thread prints in agentIndex's output buffer."
         if not self.muteAgents: return
-        global OLD_STDOUT, OLD_STDERR
-        import cStringIO
-        OLD_STDOUT = sys.stdout
-        OLD_STDERR = sys.stderr
-        sys.stdout = self.agentOutput[agentIndex]
-        sys.stderr = self.agentOutput[agentIndex]
+        redirectOutput(self.agentOutput[agentIndex])
 
     def unmute(self):
         if not self.muteAgents: return
-        global OLD_STDOUT, OLD_STDERR
-        # Revert stdout/stderr to originals
-        sys.stdout = OLD_STDOUT
-        sys.stderr = OLD_STDERR
+        restoreOutput()
 
+    def _openOutputLog( self ):
+        if not self.muteAgents or self.outputLog == None: return
+        self.outputLogFile = open(self.outputLog, 'w')
+        for output in self.agentOutput:
+            output.log = self.outputLogFile
 
-    def run( self ):
+    def _closeOutputLog( self ):
+        if self.outputLogFile == None: return
+        for output in self.agentOutput:
+            output.log = None
+        self.outputLogFile.close()
+        self.outputLogFile = None
+
+
+    def _startGame( self ):
         """
-        Main control loop for game play.
+        Shows the initial state and returns the forward model budget for
+        pacman's first move (registerInitialState included).
         """
         self.display.initialize(self.state.data)
         self.numMoves = 0
-        Game.totalFoodAndCapsules = self.state.getNumFood() + len(self.state.getCapsules());
-
+        self.totalFoodAndCapsules = self.state.getNumFood() + len(self.state.getCapsules());
+        if COUNTERS.enabled():
+            self.operationCounts = [{} for agent in self.agents]
+            self.countedMoves = [0 for agent in self.agents]
         ###self.display.initialize(self.state.makeObservation(1).data)
-        # inform learning agents of the game start
-        for i in range(len(self.agents)):
-            agent = self.agents[i]
-            if not agent:
-                self.mute(i)
-                # this is a null agent, meaning it failed to load
-                # the other team wins
-                print >>sys.stderr, "Agent %d failed to load" % i
-                self.unmute()
-                self._agentCrash(i, quiet=True)
-                return
-            if ("registerInitialState" in dir(agent)):
-                self.mute(i)
-                if self.catchExceptions:
+        return SimulationBudget(self.maxIterations)
+
+    def _registerAgent( self, i, simulations ):
+        "Informs a learning agent of the game start; crashes end the game."
+        agent = self.agents[i]
+        if not agent:
+            self.mute(i)
+            # this is a null agent, meaning it failed to load
+            # the other team wins
+            print >>sys.stderr, "Agent %d failed to load" % i
+            self.unmute()
+            self._agentCrash(i, quiet=True)
+            return
+        if ("registerInitialState" in dir(agent)):
+            self.mute(i)
+            if self.catchExceptions:
+                try:
+                    timed_func = TimeoutFunction(agent.registerInitialState, self.rules.getMaxStartupTime(i))
                     try:
-                        timed_func = TimeoutFunction(agent.registerInitialState, int(self.rules.getMaxStartupTime(i)))
-                        try:
-                            start_time = time.time()
-                            timed_func(self.state.deepCopy())
-                            time_taken = time.time() - start_time
-                            self.totalAgentTimes[i] += time_taken
-                        except TimeoutFunctionException:
-                            print >>sys.stderr, "Agent %d ran out of time on startup!" % i
-                            self.unmute()
-                            self.agentTimeout = True
-                            self._agentCrash(i, quiet=True)
-                            return
-                    except Exception,data:
-                        self._agentCrash(i, quiet=False)
+                        start_time = monotonicTime()
+                        timed_func(self.observe(i, simulations))
+                        time_taken = monotonicTime() - start_time
+                        self.totalAgentTimes[i] += time_taken
+                    except TimeoutFunctionException:
+                        print >>sys.stderr, "Agent %d ran out of time on startup!" % i
                         self.unmute()
+                        self.agentTimeout = True
+                        self._agentCrash(i, quiet=True)
                         return
-                else:
-                    agent.registerInitialState(self.state.deepCopy())
-                ## TODO: could this exceed the total time
-                self.unmute()
-
-        agentIndex = self.startingIndex
-        numAgents = len( self.agents )
-        gameStart = time.time()
+                except Exception,data:
+                    self._agentCrash(i, quiet=False)
+                    self.unmute()
+                    return
+            else:
+                agent.registerInitialState(self.observe(i, simulations))
+            ## TODO: could this exceed the total time
+            self.unmute()
 
-        while (not self.gameOver) and (time.time()-gameStart < Game.timeLimit):
-            # Fetch the next agent
-            agent = self.agents[agentIndex]
-            move_time = 0
-            skip_action = False
-            # Generate an observation of the state
-            observation = self.state.deepCopy()
+    def _solicitAction( self, agentIndex, observation, simulations ):
+        """
+        Asks agentIndex for its action, enforcing the time limits when
+        catching exceptions.  Check agentCrashed afterwards.
+        """
+        agent = self.agents[agentIndex]
+        move_time = 0
+        skip_action = False
+        anytime = hasattr(agent, 'getActionAnytime')
 
-            # Solicit an action
-            action = None
-            self.mute(agentIndex)
+        # Solicit an action
+        action = None
+        self.mute(agentIndex)
 
-            if self.catchExceptions:
+        if self.catchExceptions:
+            try:
+                moveTimeout = self.rules.getMoveTimeout(agentIndex) - move_time
+                budget = None
+                if anytime: budget = MoveBudget(moveTimeout, simulations)
+                timed_func = TimeoutFunction(self.requestAction, moveTimeout)
                 try:
-                    timed_func = TimeoutFunction(agent.getAction, int(self.rules.getMoveTimeout(agentIndex)) - int(move_time))
-                    try:
-                        start_time = time.time()
-                        if skip_action:
-                            raise TimeoutFunctionException()
-                        action = timed_func( observation )
-                    except TimeoutFunctionException:
+                    start_time = monotonicTime()
+                    if skip_action:
+                        raise TimeoutFunctionException()
+                    action = timed_func( agent, observation, budget )
+                except TimeoutFunctionException:
+                    if budget == None or budget.bestAction == None:
                         print >>sys.stderr, "Agent %d timed out on a single move!" % agentIndex
                         self.agentTimeout = True
                         self._agentCrash(agentIndex, quiet=True)
                         self.unmute()
                         return
+                    # An anytime agent used its whole budget: play its best action
+                    action = budget.bestAction
 
-                    move_time += time.time() - start_time
-
-                    if move_time > self.rules.getMoveWarningTime(agentIndex):
-                        self.totalAgentTimeWarnings[agentIndex] += 1
-                        print >>sys.stderr, "Agent %d took too long to make a move! This is warning %d" % (agentIndex, self.totalAgentTimeWarnings[agentIndex])
-                        if self.totalAgentTimeWarnings[agentIndex] > self.rules.getMaxTimeWarnings(agentIndex):
-                            print >>sys.stderr, "Agent %d exceeded the maximum number of warnings: %d" % (agentIndex, self.totalAgentTimeWarnings[agentIndex])
-                            self.agentTimeout = True
-                            self._agentCrash(agentIndex, quiet=True)
-                            self.unmute()
-                            return
-
-                    self.totalAgentTimes[agentIndex] += move_time
-                    #print "Agent: %d, time: %f, total: %f" % (agentIndex, move_time, self.totalAgentTimes[agentIndex])
-                    if self.totalAgentTimes[agentIndex] > self.rules.getMaxTotalTime(agentIndex):
-                        print >>sys.stderr, "Agent %d ran out of time! (time: %1.2f)" % (agentIndex, self.totalAgentTimes[agentIndex])
-                        self.agentTimeout = True
-                        self._agentCrash(agentIndex, quiet=True)
-                        self.unmute()
-                        return
-                    self.unmute()
-                except Exception,data:
-                    self._agentCrash(agentIndex)
-                    self.unmute()
-                    return
-            else:
-                action = agent.getAction(observation)
+                move_time += monotonicTime() - start_time
+                # Anytime agents are meant to use their whole budget
+                self._chargeMoveTime(agentIndex, move_time, not anytime)
+                self.unmute()
+            except Exception,data:
+                self._agentCrash(agentIndex)
+                self.unmute()
+                return
+        else:
+            budget = None
+            if anytime: budget = MoveBudget(None, simulations)
+            action = self.requestAction(agent, observation, budget)
+        self.unmute()
+        return action
+
+    def _countOperations( self, agentIndex, before ):
+        "Adds the engine calls made since the snapshot before to agentIndex's."
+        operations = COUNTERS.since(before)
+        totals = self.operationCounts[agentIndex]
+        for name, calls in operations.items():
+            totals[name] = totals.get(name, 0) + calls
+        self.countedMoves[agentIndex] += 1
+        return operations
+
+    def _chargeMoveTime( self, agentIndex, move_time, warn=True ):
+        """
+        Adds move_time to the agent's total, timing it out if that was one
+        slow move too many or its total time has run out.
+        """
+        if warn and move_time > self.rules.getMoveWarningTime(agentIndex):
+            self.totalAgentTimeWarnings[agentIndex] += 1
+            print >>sys.stderr, "Agent %d took too long to make a move! This is warning %d" % (agentIndex, self.totalAgentTimeWarnings[agentIndex])
+            if self.totalAgentTimeWarnings[agentIndex] > self.rules.getMaxTimeWarnings(agentIndex):
+                print >>sys.stderr, "Agent %d exceeded the maximum number of warnings: %d" % (agentIndex, self.totalAgentTimeWarnings[agentIndex])
+                self.agentTimeout = True
+                self._agentCrash(agentIndex, quiet=True)
+                return
+
+        self.totalAgentTimes[agentIndex] += move_time
+        #print "Agent: %d, time: %f, total: %f" % (agentIndex, move_time, self.totalAgentTimes[agentIndex])
+        if self.totalAgentTimes[agentIndex] > self.rules.getMaxTotalTime(agentIndex):
+            print >>sys.stderr, "Agent %d ran out of time! (time: %1.2f)" % (agentIndex, self.totalAgentTimes[agentIndex])
+            self.agentTimeout = True
+            self._agentCrash(agentIndex, quiet=True)
+
+    def _executeAction( self, agentIndex, action ):
+        self.moveHistory.append( (agentIndex, action) )
+        if self.catchExceptions:
+            try:
+                self.state = self.state.generateSuccessor( agentIndex, action )
+            except Exception,data:
+                self.mute(agentIndex)
+                self._agentCrash(agentIndex)
+                self.unmute()
+        else:
+            self.state = self.state.generateSuccessor( agentIndex, action )
+
+    def _endTurn( self, agentIndex, simulations ):
+        """
+        Applies the rules after agentIndex's move and returns the forward
+        model budget for the next move.
+        """
+        # Allow for game specific conditions (winning, losing, etc.)
+        self.rules.process(self.state, self)
+        # Track progress
+        if agentIndex == len(self.agents) + 1: self.numMoves += 1
+        if agentIndex == 0:
+            self.simulationReports.append(simulations.report())
+            simulations = SimulationBudget(self.maxIterations)
+
+        if _BOINC_ENABLED:
+            boinc.set_fraction_done(self.getProgress())
+        return simulations
+
+    def _recordResult( self, gameStart ):
+        self.notLossButTime = monotonicTime()-gameStart < self.timeLimit
+        self.movementHistory = [y[1] for x,y in enumerate(self.moveHistory) if y[0] == 0]
+        if len(self.fileName) > 0:
+            f = open(self.fileName, "w")
+            for a in self.movementHistory:
+                f.write(a + "\n")
+            f.close()
+
+    def _finalAgent( self, agentIndex ):
+        "Informs a learning agent of the game result."
+        try:
+            self.mute(agentIndex)
+            self.agents[agentIndex].final( self.state )
+            self.unmute()
+        except Exception,data:
+            if not self.catchExceptions: raise
+            self._agentCrash(agentIndex)
             self.unmute()
 
+    def run( self ):
+        """
+        Main control loop for game play.
+        """
+        self._openOutputLog()
+        if self.tracer != None: self.trace = self.tracer.startGame(self)
+        try:
+            self._run()
+        finally:
+            self._closeOutputLog()
+
+    def _run( self ):
+        # Forward model calls for pacman's next move, startup included
+        simulations = self._startGame()
+        trace = self.trace
+        counting = self.operationCounts != None
+        operations = {}
+        # inform learning agents of the game start
+        for i in range(len(self.agents)):
+            if trace != None: trace.begin()
+            self._registerAgent(i, simulations)
+            if trace != None: trace.end('registerInitialState', i)
+            if self.agentCrashed: return
+
+        agentIndex = self.startingIndex
+        numAgents = len( self.agents )
+        gameStart = monotonicTime()
+
+        while (not self.gameOver) and (monotonicTime()-gameStart < self.timeLimit):
+            # Generate an observation of the state and solicit an action
+            observation = self.observe(agentIndex, simulations)
+            if trace != None:
+                trace.begin()
+                granted = simulations.granted
+            if counting: before = COUNTERS.snapshot()
+            action = self._solicitAction(agentIndex, observation, simulations)
+            if counting: operations = self._countOperations(agentIndex, before)
+            if trace != None: trace.end('getAction', agentIndex, simulations=simulations.granted - granted, **operations)
+            if self.agentCrashed: return
+
             # Execute the action
-            self.moveHistory.append( (agentIndex, action) )
-            if self.catchExceptions:
-                try:
-                    self.state = self.state.generateSuccessor( agentIndex, action )
-                except Exception,data:
-                    self.mute(agentIndex)
-                    self._agentCrash(agentIndex)
-                    self.unmute()
-                    return
-            else:
-                self.state = self.state.generateSuccessor( agentIndex, action )
+            if trace != None: trace.begin()
+            self._executeAction(agentIndex, action)
+            if trace != None: trace.end('generateSuccessor', agentIndex)
+            if self.agentCrashed: return
 
             # Change the display
+            if trace != None: trace.begin()
             self.display.update( self.state.data )
+            if trace != None: trace.end('update', trace.display)
             ###idx = agentIndex - agentIndex % 2 + 1
             ###self.display.update( self.state.makeObservation(idx).data )
 
-            # Allow for game specific conditions (winning, losing, etc.)
-            self.rules.process(self.state, self)
-            # Track progress
-            if agentIndex == numAgents + 1: self.numMoves += 1
-            if agentIndex == 0: Game.currentIterations = Game.maxIterations
+            simulations = self._endTurn(agentIndex, simulations)
             # Next agent
             agentIndex = ( agentIndex + 1 ) % numAgents
 
-            if _BOINC_ENABLED:
-                boinc.set_fraction_done(self.getProgress())
-
-        Game.notLossButTime = time.time()-gameStart < Game.timeLimit
-        Game.movementHistory = [y[1] for x,y in enumerate(self.moveHistory) if y[0] == 0]
-        if len(Game.fileName) > 0:
-            f = open(Game.fileName, "w")
-            for a in Game.movementHistory:
-                f.write(a + "\n")
-            f.close()
+        self._recordResult(gameStart)
         # inform a learning agent of the game result
         for agentIndex, agent in enumerate(self.agents):
             if "final" in dir( agent ) :
-                try:
-                    self.mute(agentIndex)
-                    agent.final( self.state )
-                    self.unmute()
-                except Exception,data:
-                    if not self.catchExceptions: raise
-                    self._agentCrash(agentIndex)
-                    self.unmute()
-                    return
+                self._finalAgent(agentIndex)
+                if self.agentCrashed: return
         self.display.finish()
+
+    def runAsync( self, loop ):
+        """
+        The main control loop as a coroutine for an eventLoop.EventLoop, so
+        one thread can play many games at once:
+
+          loop.spawn( game.runAsync( loop ) )
+
+        Agents may define getActionAsync(state), and optionally
+        registerInitialStateAsync(state) and finalAsync(state), returning a
+        Future or a coroutine; with catchExceptions their per-move timeouts
+        are enforced by the loop.  Displays may likewise define
+        updateAsync(data).  Other agents are called as run() calls them,
+        blocking the loop, so run() stays the fast path for agents that
+        compute.  Output from async agents is not muted.
+        """
+        self._openOutputLog()
+        if self.tracer != None: self.trace = self.tracer.startGame(self)
+        try:
+            yield self._runAsync(loop)
+        finally:
+            self._closeOutputLog()
+
+    def _runAsync( self, loop ):
+        simulations = self._startGame()
+        trace = self.trace
+        counting = self.operationCounts != None
+        operations = {}
+        for i in range(len(self.agents)):
+            agent = self.agents[i]
+            if trace != None: trace.begin()
+            if agent and hasattr(agent, 'registerInitialStateAsync'):
+                outcome = yield self._awaitAgent(loop, agent.registerInitialStateAsync(self.observe(i, simulations)),
+                                                 self.rules.getMaxStartupTime(i))
+                self._asyncOutcome(i, outcome, "Agent %d ran out of time on startup!", 'startup')
+            else:
+                self._registerAgent(i, simulations)
+            if trace != None: trace.end('registerInitialState', i)
+            if self.agentCrashed: return
+
+        agentIndex = self.startingIndex
+        numAgents = len( self.agents )
+        gameStart = monotonicTime()
+
+        while (not self.gameOver) and (monotonicTime()-gameStart < self.timeLimit):
+            observation = self.observe(agentIndex, simulations)
+            agent = self.agents[agentIndex]
+            if trace != None:
+                trace.begin()
+                granted = simulations.granted
+            if hasattr(agent, 'getActionAsync'):
+                outcome = yield self._awaitAgent(loop, agent.getActionAsync(observation),
+                                                 self.rules.getMoveTimeout(agentIndex))
+                action = self._asyncOutcome(agentIndex, outcome, "Agent %d timed out on a single move!")
+                operations = {}
+            else:
+                # Other games run while async agents wait, so only these are counted
+                if counting: before = COUNTERS.snapshot()
+                action = self._solicitAction(agentIndex, observation, simulations)
+                if counting: operations = self._countOperations(agentIndex, before)
+            if trace != None: trace.end('getAction', agentIndex, simulations=simulations.granted - granted, **operations)
+            if self.agentCrashed: return
+
+            if trace != None: trace.begin()
+            self._executeAction(agentIndex, action)
+            if trace != None: trace.end('generateSuccessor', agentIndex)
+            if self.agentCrashed: return
+
+            if trace != None: trace.begin()
+            if hasattr(self.display, 'updateAsync'):
+                yield loop.future(self.display.updateAsync(self.state.data))
+            else:
+                self.display.update( self.state.data )
+            if trace != None: trace.end('update', trace.display)
+
+            simulations = self._endTurn(agentIndex, simulations)
+            agentIndex = ( agentIndex + 1 ) % numAgents
+
+        self._recordResult(gameStart)
+        for agentIndex, agent in enumerate(self.agents):
+            if hasattr(agent, 'finalAsync'):
+                outcome = yield self._awaitAgent(loop, agent.finalAsync(self.state), self.rules.getMoveTimeout(agentIndex))
+                self._asyncOutcome(agentIndex, outcome, "Agent %d timed out on a single move!", None)
+            elif "final" in dir( agent ) :
+                self._finalAgent(agentIndex)
+            if self.agentCrashed: return
+        self.display.finish()
+
+    def _awaitAgent( self, loop, call, timeout ):
+        """
+        Returns a Future for what an async agent method returned.  It never
+        fails: it resolves to (result, excInfo, seconds taken).
+        """
+        import eventLoop
+        start = monotonicTime()
+        future = loop.future(call)
+        if self.catchExceptions and timeout:
+            future = loop.waitFor(future, timeout)
+        outcome = eventLoop.Future()
+        def finish(future):
+            excInfo = future.excInfo
+            if future.exception != None and excInfo == None:
+                excInfo = (type(future.exception), future.exception, None)
+            outcome.setResult((future.result, excInfo, monotonicTime() - start))
+        future.addCallback(finish)
+        return outcome
+
+    def _asyncOutcome( self, agentIndex, outcome, timeoutMessage, timing='move' ):
+        """
+        Handles the outcome of an async agent call like run() handles a
+        synchronous one, and returns its result.  timing is 'move' for a
+        move, 'startup' for registerInitialState, which only adds to the
+        agent's total time, and None for final, which is not timed.
+        """
+        result, excInfo, seconds = outcome
+        if excInfo != None:
+            if not self.catchExceptions: raise excInfo[0], excInfo[1], excInfo[2]
+            if excInfo[0] == TimeoutFunctionException:
+                print >>sys.stderr, timeoutMessage % agentIndex
+                self.agentTimeout = True
+                self._agentCrash(agentIndex, quiet=True)
+            else:
+                traceback.print_exception(*excInfo)
+                self._agentCrash(agentIndex, quiet=True)
+            return None
+        if self.catchExceptions and timing == 'move':
+            self._chargeMoveTime(agentIndex, seconds)
+        elif self.catchExceptions and timing == 'startup':
+            self.totalAgentTimes[agentIndex] += seconds
+        return result
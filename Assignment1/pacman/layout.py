@@ -13,28 +13,35 @@
 
 
 from util import manhattanDistance
-from game import Grid
+from game import Grid, BitGrid
 import os
 import random
 
 VISIBILITY_MATRIX_CACHE = {}
+ACTION_TABLE_CACHE = {}
 
 class Layout:
     """
     A Layout manages the static information about the game board.
+
+    Layouts are treated as immutable once loaded: every game state and every
+    observation of a game shares one Layout, and states copy the layout's
+    food and capsules before changing them.
     """
 
     def __init__(self, layoutText):
         self.width = len(layoutText[0])
         self.height= len(layoutText)
+        # Walls are never counted or hashed, so a list Grid reads them fastest
         self.walls = Grid(self.width, self.height, False)
-        self.food = Grid(self.width, self.height, False)
+        self.food = BitGrid(self.width, self.height, False)
         self.capsules = []
         self.agentPositions = []
         self.numGhosts = 0
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
+        self.initializeActionTables()
         # self.initializeVisibilityMatrix()
 
     def getNumGhosts(self):
@@ -61,6 +68,38 @@ class Layout:
         else:
             self.visibility = VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)]
 
+    def initializeActionTables(self):
+        """
+        Precomputes legal actions for every open cell.  pacmanActions maps a
+        position to the moves Actions.getPossibleActions allows there, and
+        ghostActions maps (position, heading) to the moves left after the
+        ghost rules drop STOP and, unless it is the only way out, reversing.
+        Positions between cells are not in the tables.
+        """
+        global ACTION_TABLE_CACHE
+        key = tuple(self.layoutText)
+        if key not in ACTION_TABLE_CACHE:
+            from game import Actions, Configuration, Directions
+            headings = [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST, Directions.STOP]
+            pacmanActions = {}
+            ghostActions = {}
+            for x in range(self.width):
+                for y in range(self.height):
+                    if self.walls[x][y]: continue
+                    try:
+                        possible = Actions.getPossibleActions(Configuration((x, y), Directions.STOP), self.walls)
+                    except IndexError:
+                        continue # Open border cell: leave it to the slow path
+                    pacmanActions[(x, y)] = tuple(possible)
+                    for heading in headings:
+                        actions = [a for a in possible if a != Directions.STOP]
+                        reverse = Actions.reverseDirection(heading)
+                        if reverse in actions and len(actions) > 1:
+                            actions.remove(reverse)
+                        ghostActions[((x, y), heading)] = tuple(actions)
+            ACTION_TABLE_CACHE[key] = (pacmanActions, ghostActions)
+        self.pacmanActions, self.ghostActions = ACTION_TABLE_CACHE[key]
+
     def isWall(self, pos):
         x, col = pos
         return self.walls[x][col]
@@ -90,7 +129,8 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        # Immutable, so a copy is the layout itself
+        return self
 
     def processLayoutText(self, layoutText):
         """
@@ -12,7 +12,7 @@
 # Pieter Abbeel (pabbeel@cs.berkeley.edu).
 
 
-from pacman import Directions
+from pacman import Directions, GameState
 from game import Agent
 from heuristics import *
 import random
@@ -64,14 +64,15 @@ class BFSAgent(Agent):
         if state.isWin() or state.isLose():
             return Directions.STOP
         # Use fringe_paths_queue to track all paths and states
+        # visited holds compact state keys rather than whole states
         visited = set()
         queue = []
         root_node = Node(state, None, admissibleHeuristic(state), 0)
-        visited.add(root_node.state)
+        visited.add(root_node.state.key())
         queue.append(root_node)
         while queue:
             node = queue.pop(0)
-            visited.add(node.state)
+            visited.add(node.state.key())
             legal = node.state.getLegalPacmanActions()
             successors = [(node.state.generatePacmanSuccessor(action), action) for action in legal]
             for successor in successors:
@@ -86,7 +87,7 @@ class BFSAgent(Agent):
                     # return the action lead to this node.
                     action = min_node.action_finder(root_node)
                     return action
-                if new_state not in visited:
+                if new_state.key() not in visited:
                     h = 0 if new_state is None else admissibleHeuristic(new_state)
                     new_node = Node(new_state, new_action, h, node.g_cost+1)
                     new_node.prev = node
@@ -108,40 +109,73 @@ class DFSAgent(Agent):
     def getAction(self, state):
         if state.isWin() or state.isLose():
             return Directions.STOP
+        # Depth first search only ever needs the current path, so a single
+        # working state walks down it with apply() and back up with undo()
+        # instead of keeping a copied state per node.
+        state = GameState(state)
+        # visited holds compact state keys rather than whole states
         visited = set()
-        stack = []
-        root_node = Node(state, None, admissibleHeuristic(state), 0)
-        visited.add(state)
-        stack.append(root_node)
-        while stack:
-            node = stack.pop(-1)
-            visited.add(node.state)          
-            legal = node.state.getLegalPacmanActions()
-            successors = [(node.state.generatePacmanSuccessor(action), action) for action in legal]
-            for successor in successors:
-                # If current state has been visted, skip
-                new_state, new_action = successor[0], successor[1]
+        visited.add(state.key())
+        # path holds (undo record, action, unexplored sibling actions) per level
+        path = []
+        # The first action towards the node with lowest total cost seen so far
+        best_cost, best_action = None, Directions.STOP
+        while True:
+            # Look at every successor of the current node, keep the ones worth
+            # exploring.  The last one kept stays applied: it is the child the
+            # search goes down, straight from the state that was looked at.
+            children = []
+            kept = None
+            for action in state.getLegalPacmanActions():
+                if kept is not None:
+                    state.undo(kept[0])
+                    kept = None
+                record = state.apply(action)
                 # If exceed the limit
-                if new_state is None:
-                    min_node = node
-                    # Iterate all nodes in stack, find the one with lowest total cost
-                    for n in stack:
-                        if n.tot_cost < min_node.tot_cost:
-                            min_node = n
-                    # return the action lead to this node.
-                    action = min_node.action_finder(root_node)
-                    return action
-                if new_state not in visited:
-                    h = admissibleHeuristic(new_state)
-                    new_node = Node(new_state, new_action, h, node.g_cost+1)
-                    new_node.prev = node
-                    if new_node.state.isWin():
-                        action = new_node.action_finder(root_node)
-                        return action
-                    # If in a deadlock, skip this one, continue the loop.
-                    if new_node.state.isLose():
-                        continue
-                    stack.append(new_node)
+                if record is None:
+                    return best_action
+                first_action = path[0][1] if path else action
+                key = state.key()
+                # If current state has been visted, skip
+                if key in visited:
+                    state.undo(record)
+                    continue
+                if state.isWin():
+                    return first_action
+                # If in a deadlock, skip this one, continue the loop.
+                if state.isLose():
+                    state.undo(record)
+                    continue
+                h = admissibleHeuristic(state)
+                if best_cost is None or len(path) + 1 + h < best_cost:
+                    best_cost, best_action = len(path) + 1 + h, first_action
+                children.append(action)
+                kept = (record, key)
+            if kept is not None:
+                record, key = kept
+                visited.add(key)
+                path.append((record, children.pop(-1), children))
+                continue
+            # A dead end: go back up to the nearest level with a sibling left
+            while True:
+                while not children:
+                    if not path:
+                        return best_action
+                    record, action, children = path.pop(-1)
+                    state.undo(record)
+                action = children.pop(-1)
+                record = state.apply(action)
+                if record is None:
+                    return best_action
+                # The ghosts may move differently than when the sibling was looked at
+                if state.isWin():
+                    return path[0][1] if path else action
+                if state.isLose() or state.key() in visited:
+                    state.undo(record)
+                    continue
+                visited.add(state.key())
+                path.append((record, action, children))
+                break
 
 
 class AStarAgent(Agent):
@@ -159,13 +193,14 @@ class AStarAgent(Agent):
         open_pq = []
         graph = dict()
         open_pq.append(root_node)
-        closed.add(root_node.state)
-        # This is a dictionary of {state: Node}
-        graph[state] = root_node
+        closed.add(root_node.state.key())
+        # This is a dictionary of {state key: Node}
+        root_key = state.key()
+        graph[root_key] = root_node
         while open_pq:
             node = open_pq.pop(0)
-            closed.add(node.state)
-            graph[node.state]= node
+            closed.add(node.state.key())
+            graph[node.state.key()]= node
             if node.state.isWin():
                 return node.action_finder(root_node)
             if node.state.isLose():
@@ -185,14 +220,15 @@ class AStarAgent(Agent):
                 new_node = Node(new_state, new_action,
                                 h, parent_node.g_cost+1)
                 new_node.prev = parent_node
-                if new_state not in graph:
+                new_key = new_state.key()
+                if new_key not in graph:
                     open_pq.append(new_node)
-                elif new_node.tot_cost < graph[state].tot_cost:
+                elif new_node.tot_cost < graph[root_key].tot_cost:
                     # If this node already in the graph, and has a better total cost,
                     # we need to redirect the node
-                    graph[new_state].prev = parent_node
+                    graph[new_key].prev = parent_node
                     # Update the total cost of the node which already exist
-                    graph[new_state].tot_cost= new_node.tot_cost
+                    graph[new_key].tot_cost= new_node.tot_cost
             # sort the pq first by the total cost, then by the negative g_cost(the depth of the node)
             open_pq.sort(key=lambda node: [node.tot_cost, -node.g_cost])
 
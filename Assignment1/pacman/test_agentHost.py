@@ -0,0 +1,82 @@
+# test_agentHost.py
+# -----------------
+# Regression tests for agents hosted in worker processes (agentHost.py).
+#
+# Run with:  python -m unittest discover -p 'test_*.py'
+
+import unittest, random, os, time
+import agentHost
+from game import Agent, Directions, MoveBudget, SimulationBudget
+from util import TimeoutFunction, TimeoutFunctionException
+from test_gameState import newGame, initialState
+
+class RandomLookAheadAgent( Agent ):
+    "Draws on the shared random number generator itself and through the ghosts."
+    def __init__( self, index=0, avoidLosing=False ):
+        Agent.__init__( self, index )
+        self.avoidLosing = avoidLosing
+
+    def getAction( self, state ):
+        actions = state.getLegalPacmanActions()
+        random.shuffle( actions )
+        for action in actions:
+            successor = state.generatePacmanSuccessor( action )
+            if successor != None and not (self.avoidLosing and successor.isLose()): return action
+        return random.choice( actions or [Directions.STOP] )
+
+class AnytimeLookAheadAgent( RandomLookAheadAgent ):
+    "Reports the first action that does not lose and leaves it to the game to play it."
+    def getActionAnytime( self, state, budget ):
+        budget.report( RandomLookAheadAgent.getAction( self, state ) )
+
+class StallingAgent( Agent ):
+    "Reports West, then thinks until it is stopped."
+    def getActionAnytime( self, state, budget ):
+        budget.report( Directions.WEST )
+        while True: time.sleep( 0.001 )
+
+def playSeeded( agent, seed ):
+    random.seed( seed )
+    game = newGame( agent )
+    game.run()
+    return game.state.getScore(), game.moveHistory
+
+class HostedAgentTest( unittest.TestCase ):
+
+    def testIsolatedGamesPlayOutAsInProcess( self ):
+        if not hasattr( os, 'fork' ): return
+        for seed in range( 3 ):
+            hosted = agentHost.HostedAgent( agentHost.AgentFactory( RandomLookAheadAgent, {'avoidLosing': True} ) )
+            try:
+                self.assertEqual( playSeeded( hosted, seed ), playSeeded( RandomLookAheadAgent( avoidLosing=True ), seed ) )
+            finally:
+                hosted.stop()
+
+    def testAnytimeAgentsStayAnytime( self ):
+        if not hasattr( os, 'fork' ): return
+        self.assertFalse( hasattr( agentHost.HostedAgent( RandomLookAheadAgent ), 'getActionAnytime' ) )
+        for seed in range( 3 ):
+            hosted = agentHost.HostedAgent( AnytimeLookAheadAgent )
+            try:
+                self.assertTrue( hasattr( hosted, 'getActionAnytime' ) )
+                self.assertEqual( playSeeded( hosted, seed ), playSeeded( AnytimeLookAheadAgent(), seed ) )
+            finally:
+                hosted.stop()
+
+    def testDeadlineKeepsTheReportedAction( self ):
+        if not hasattr( os, 'fork' ): return
+        hosted = agentHost.HostedAgent( StallingAgent )
+        try:
+            state = initialState()
+            hosted.registerInitialState( state )
+            state.budget = SimulationBudget( 100 )
+            budget = MoveBudget( 0.2, state.budget )
+            timed = TimeoutFunction( hosted.getActionAnytime, 0.2 )
+            self.assertRaises( TimeoutFunctionException, timed, state, budget )
+            self.assertEqual( budget.bestAction, Directions.WEST )
+            self.assertEqual( hosted.pid, None )
+        finally:
+            hosted.stop()
+
+if __name__ == '__main__':
+    unittest.main()
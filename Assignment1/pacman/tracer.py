@@ -0,0 +1,104 @@
+# tracer.py
+# ---------
+# Per-move timing of games, exported as a Chrome trace.
+#
+# A Tracer collects, for every turn of every game it is given, how long the
+# agent took to choose its action (wall and CPU time, and the forward model
+# calls granted to it), how long generateSuccessor took to apply it and how long
+# the display took to draw it.  The trace opens in chrome://tracing or
+# https://ui.perfetto.dev: each game is a process, each agent a thread.
+
+"""
+USAGE:      python pacman.py -p MCTSAgent -q -n 3 --trace moves.json
+"""
+
+import json, time, threading
+from util import monotonicTime
+
+class Tracer:
+    """
+    Collects the GameTraces of any number of games, from any thread.
+    """
+    def __init__( self ):
+        self.origin = monotonicTime()
+        self.traces = []
+        self.lock = threading.Lock()
+
+    def startGame( self, game ):
+        "Returns the GameTrace to record game in."
+        with self.lock:
+            trace = GameTrace( self, len( self.traces ) + 1, len( game.agents ) )
+            self.traces.append( trace )
+        return trace
+
+    def write( self, fileName ):
+        "Writes every game traced so far as Chrome trace-event JSON."
+        events = []
+        for trace in self.traces:
+            events.extend( trace.metadata() )
+            events.extend( trace.events )
+        f = open( fileName, 'w' )
+        json.dump( {'traceEvents': events, 'displayTimeUnit': 'ms',
+                    'otherData': {'games': [trace.summary() for trace in self.traces]}}, f )
+        f.close()
+
+class GameTrace:
+    """
+    The events of one game.  begin() starts timing a step and end() records
+    it, so steps must not overlap; the display is traced as the thread after
+    the agents'.  CPU time is the whole process's, so it only means the
+    step's own when games are played one at a time.
+    """
+    def __init__( self, tracer, number, numAgents ):
+        self.tracer = tracer
+        self.number = number
+        self.numAgents = numAgents
+        self.display = numAgents
+        self.events = []
+        self.started = None
+        self.totals = {}
+
+    def begin( self ):
+        self.started = (monotonicTime(), time.clock())
+
+    def end( self, name, thread, **args ):
+        wall, cpu = self.started
+        wall, cpu, start = monotonicTime() - wall, time.clock() - cpu, wall
+        args['cpuMs'] = round( cpu * 1e3, 3 )
+        self.events.append( {'name': name, 'ph': 'X', 'pid': self.number, 'tid': thread, 'args': args,
+                             'ts': int( (start - self.tracer.origin) * 1e6 ), 'dur': int( wall * 1e6 )} )
+        key = (thread, name)
+        calls, walls, cpus, longest, simulations = self.totals.get( key, (0, 0.0, 0.0, 0.0, 0) )
+        self.totals[key] = (calls + 1, walls + wall, cpus + cpu, max( longest, wall ),
+                            simulations + args.get( 'simulations', 0 ))
+
+    def threadName( self, thread ):
+        if thread == self.display: return 'display'
+        if thread == 0: return 'pacman'
+        return 'ghost %d' % thread
+
+    def metadata( self ):
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': self.number, 'args': {'name': 'game %d' % self.number}}]
+        for thread in range( self.numAgents + 1 ):
+            events.append( {'name': 'thread_name', 'ph': 'M', 'pid': self.number, 'tid': thread,
+                            'args': {'name': self.threadName( thread )}} )
+        return events
+
+    def summary( self ):
+        """
+        Returns a row per (thread, step) traced: the number of steps, their
+        total and longest wall time and total CPU time in seconds, and the
+        forward model calls granted in them.
+        """
+        rows = []
+        for (thread, name), (calls, walls, cpus, longest, simulations) in sorted( self.totals.items() ):
+            rows.append( {'game': self.number, 'thread': self.threadName( thread ), 'step': name, 'count': calls,
+                          'wall': walls, 'cpu': cpus, 'max': longest, 'simulations': simulations} )
+        return rows
+
+    def printSummary( self ):
+        print 'Game %d time:' % self.number
+        print '  %-10s %-20s %6s %10s %10s %10s %12s' % ('', '', 'count', 'wall (s)', 'cpu (s)', 'max (ms)', 'simulations')
+        for row in self.summary():
+            print '  %-10s %-20s %6d %10.3f %10.3f %10.1f %12d' % (row['thread'], row['step'], row['count'], row['wall'],
+                                                                   row['cpu'], row['max'] * 1e3, row['simulations'])
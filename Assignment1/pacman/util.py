@@ -505,20 +505,172 @@ def pause():
 
 # code to handle timeouts
 #
-# FIXME
-# NOTE: TimeoutFuncton is NOT reentrant.  Later timeouts will silently
-# disable earlier timeouts.  Could be solved by maintaining a global list
-# of active time outs.  Currently, questions which have test cases calling
-# this have all student code so wrapped.
+# Deadlines are measured on a monotonic clock and enforced by a single
+# watchdog thread, which raises TimeoutFunctionException inside the thread
+# running the timed function.  Unlike SIGALRM this takes fractions of a
+# second, works in any thread and lets timeouts nest.  The exception is
+# delivered between Python bytecodes, so a function blocked inside a long
+# C call (e.g. time.sleep) is interrupted when that call returns.
 #
-import signal
-import time
+import time, os
+import threading
+import heapq
+
+def _monotonicClock():
+    if hasattr(time, 'monotonic'): return time.monotonic
+    try:
+        import ctypes, ctypes.util, os
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+        librt = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c'), use_errno=True)
+        clock_gettime = librt.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        CLOCK_MONOTONIC = 1
+        value = timespec()
+        def monotonic():
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.pointer(value)) != 0:
+                raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+            return value.tv_sec + value.tv_nsec * 1e-9
+        monotonic()
+        return monotonic
+    except Exception:
+        return time.time
+
+monotonicTime = _monotonicClock()
+
 class TimeoutFunctionException(Exception):
     """Exception to raise on a timeout"""
     pass
 
+def _raiseInThread(threadId, exceptionType):
+    """
+    Asynchronously raises exceptionType in another thread (None clears a
+    pending one).  Returns False where the interpreter does not support it.
+    """
+    try:
+        import ctypes
+        setAsyncExc = ctypes.pythonapi.PyThreadState_SetAsyncExc
+    except (ImportError, AttributeError):
+        return False
+    if exceptionType is None:
+        setAsyncExc(ctypes.c_long(threadId), None)
+    else:
+        setAsyncExc(ctypes.c_long(threadId), ctypes.py_object(exceptionType))
+    return True
+
+class _Deadline(object):
+    "One armed deadline; fired is set once its exception has been raised."
+    __slots__ = ('serial', 'threadId', 'fired')
+
+    def __init__(self, serial, threadId):
+        self.serial = serial
+        self.threadId = threadId
+        self.fired = False
+
+class Watchdog:
+    """
+    A daemon thread holding a heap of deadlines.  arm() registers a deadline
+    for the calling thread, disarm() removes it and reports whether it fired.
+
+    The timed thread takes no lock in disarm(): a timeout exception can
+    arrive at any bytecode, even on the way out of a with-statement, and
+    would leave a lock held.  Instead both threads pop the deadline from
+    armed, an atomic dict operation, and whichever gets it decides whether
+    the deadline fired.  Whether it fired is recorded on the deadline itself,
+    so nothing is left behind in the watchdog wherever the exception lands.
+
+    A forked child does not inherit the watchdog thread, so each process
+    gets its own Watchdog (see _watchdog()).
+    """
+    def __init__(self):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.deadlines = []
+        self.armed = {}
+        self.serial = 0
+        self.thread = None
+        self.stopped = False
+
+    def arm(self, seconds):
+        "Returns the deadline to hand to disarm()."
+        with self.lock:
+            self.serial += 1
+            deadline = _Deadline(self.serial, threading.current_thread().ident)
+            heapq.heappush(self.deadlines, (monotonicTime() + seconds, deadline.serial, deadline))
+            self.armed[deadline.serial] = deadline
+            if self.thread == None:
+                self.thread = threading.Thread(target=self._run, name='TimeoutWatchdog')
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+            return deadline
+
+    def disarm(self, deadline):
+        if self.armed.pop(deadline.serial, None) != None:
+            return False
+        # The watchdog got there first: wait until it has raised the
+        # exception, which may well arrive in this loop
+        while not deadline.fired:
+            time.sleep(0)
+        return True
+
+    def _run(self):
+        self.condition.acquire()
+        try:
+            while not self.stopped:
+                if len(self.deadlines) == 0:
+                    self.condition.wait()
+                    continue
+                when, serial, deadline = self.deadlines[0]
+                if serial not in self.armed:
+                    heapq.heappop(self.deadlines)
+                    continue
+                remaining = when - monotonicTime()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+                heapq.heappop(self.deadlines)
+                if self.armed.pop(serial, None) != None:
+                    _raiseInThread(deadline.threadId, TimeoutFunctionException)
+                    deadline.fired = True
+        finally:
+            self.condition.release()
+
+    def stop(self):
+        self.condition.acquire()
+        try:
+            self.stopped = True
+            self.condition.notify()
+        finally:
+            self.condition.release()
+        if self.thread != None:
+            self.thread.join()
+
+_WATCHDOG = None
+
+def _watchdog():
+    """
+    Returns this process's Watchdog, starting over in a forked child, where
+    the parent's watchdog thread does not exist and its lock may be held.
+    """
+    global _WATCHDOG
+    if _WATCHDOG == None or _WATCHDOG.pid != os.getpid():
+        _WATCHDOG = Watchdog()
+    return _WATCHDOG
+
+def _stopWatchdog():
+    if _WATCHDOG != None and _WATCHDOG.pid == os.getpid():
+        _WATCHDOG.stop()
+
+import atexit
+atexit.register(_stopWatchdog)
 
 class TimeoutFunction:
+    """
+    Calls function with a deadline of timeout seconds (a float; 0 or None
+    means no limit), raising TimeoutFunctionException once it is exceeded.
+    """
     def __init__(self, function, timeout):
         self.timeout = timeout
         self.function = function
@@ -527,25 +679,29 @@ class TimeoutFunction:
         raise TimeoutFunctionException()
 
     def __call__(self, *args, **keyArgs):
-        # If we have SIGALRM signal, use it to cause an exception if and
-        # when this function runs too long.  Otherwise check the time taken
-        # after the method has returned, and throw an exception then.
-        if hasattr(signal, 'SIGALRM'):
-            old = signal.signal(signal.SIGALRM, self.handle_timeout)
-            signal.alarm(self.timeout)
-            try:
-                result = self.function(*args, **keyArgs)
-            finally:
-                signal.signal(signal.SIGALRM, old)
-            signal.alarm(0)
-        else:
-            startTime = time.time()
+        if not self.timeout or self.timeout <= 0:
+            return self.function(*args, **keyArgs)
+        if not _raiseInThread(threading.current_thread().ident, None):
+            # No asynchronous exceptions: check the time taken once the
+            # function has returned, and throw an exception then.
+            startTime = monotonicTime()
             result = self.function(*args, **keyArgs)
-            timeElapsed = time.time() - startTime
-            if timeElapsed >= self.timeout:
+            if monotonicTime() - startTime >= self.timeout:
                 self.handle_timeout(None, None)
-        return result
+            return result
 
+        watchdog = _watchdog()
+        deadline = watchdog.arm(self.timeout)
+        try:
+            result = self.function(*args, **keyArgs)
+        finally:
+            fired = watchdog.disarm(deadline)
+        if fired:
+            # The deadline passed just as the function returned: drop the
+            # exception if it has not been delivered yet and report the timeout
+            _raiseInThread(threading.current_thread().ident, None)
+            self.handle_timeout(None, None)
+        return result
 
 
 _ORIGINAL_STDOUT = None
@@ -575,3 +731,112 @@ def unmutePrint():
 
     sys.stdout = _ORIGINAL_STDOUT
     #sys.stderr = _ORIGINAL_STDERR
+
+class OutputRouter(object):
+    """
+    Stands in for sys.stdout or sys.stderr and sends each thread's writes to
+    the stream that thread redirected its output to, or else to the stream
+    it replaced.  Installed once, it lets games on different threads capture
+    their agents' output without swapping the process-wide streams.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    # print keeps a pending space for "print x," on the stream; each thread
+    # has its own, or one thread's trailing comma spaces another's output
+    def _getSoftspace(self):
+        return getattr(self.local, 'softspace', 0)
+
+    def _setSoftspace(self, value):
+        self.local.softspace = value
+
+    softspace = property(_getSoftspace, _setSoftspace)
+
+    def target(self):
+        target = getattr(self.local, 'target', None)
+        if target == None: return self.stream
+        return target
+
+    def write(self, string):
+        self.target().write(string)
+
+    def writelines(self, lines):
+        self.target().writelines(lines)
+
+    def flush(self):
+        target = self.target()
+        if hasattr(target, 'flush'): target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+_ROUTER_LOCK = threading.Lock()
+
+def _routers():
+    with _ROUTER_LOCK:
+        if not isinstance(sys.stdout, OutputRouter): sys.stdout = OutputRouter(sys.stdout)
+        if not isinstance(sys.stderr, OutputRouter): sys.stderr = OutputRouter(sys.stderr)
+        return sys.stdout, sys.stderr
+
+def redirectOutput(stream):
+    """
+    Sends everything the calling thread prints, to stdout or stderr, to
+    stream until restoreOutput() is called.  Other threads are unaffected.
+    """
+    for router in _routers():
+        router.local.target = stream
+
+def restoreOutput():
+    for router in _routers():
+        router.local.target = None
+
+from collections import deque
+
+class OutputBuffer:
+    """
+    A write-only stream that keeps the last limit bytes written to it, for
+    capturing what an agent prints without letting a chatty agent use
+    unbounded memory.  truncated counts the bytes dropped to stay in the
+    limit.  If log is given, every write is also copied there as it comes.
+    """
+    def __init__(self, limit=1 << 16, log=None):
+        self.limit = limit
+        self.log = log
+        self.chunks = deque()
+        self.size = 0
+        self.truncated = 0
+
+    def write(self, string):
+        if self.log != None: self.log.write(string)
+        if len(string) >= self.limit:
+            self.truncated += self.size + len(string) - self.limit
+            self.chunks.clear()
+            string = string[len(string) - self.limit:]
+            if string: self.chunks.append(string)
+            self.size = len(string)
+            return
+        self.chunks.append(string)
+        self.size += len(string)
+        while self.size > self.limit:
+            excess = self.size - self.limit
+            first = self.chunks[0]
+            if len(first) <= excess:
+                self.chunks.popleft()
+                dropped = len(first)
+            else:
+                self.chunks[0] = first[excess:]
+                dropped = excess
+            self.size -= dropped
+            self.truncated += dropped
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if self.log != None: self.log.flush()
+
+    def getvalue(self):
+        "Returns what is kept, the last limit bytes written."
+        return ''.join(self.chunks)
@@ -0,0 +1,343 @@
+# gameServer.py
+# -------------
+# Hosts games for remote bots over a local TCP or Unix socket.
+#
+# Bots connect to the server and are given games as they become free, so
+# one connection plays many games in turn and many connections play at
+# once, all on one event loop (see eventLoop.py and Game.runAsync).  A bot
+# can be written in any language: messages are single lines of JSON, and
+# after the start of a game only what changed is sent.
+
+"""
+USAGE:      python pacman.py --serve 127.0.0.1:7777 -n 100 -l mediumClassic -c --moveTimeout 0.1
+            python botClient.py --connect 127.0.0.1:7777 -p RandomAgent
+
+PROTOCOL (one JSON object per line):
+
+  server -> bot  {"type": "start", "id": 1, "game": 3, "layout": [...rows...],
+                  "numGhosts": 2, "iterations": 500, "moveTimeout": 0.1}
+  bot -> server  {"id": 1}
+      The state is the layout's initial state.  Answer once ready.
+
+  server -> bot  {"type": "move", "id": 2, "delta": {...}}
+  bot -> server  {"id": 2, "action": "North"}
+      delta holds what changed since the last state the bot was sent:
+        "agents":   [[index, x, y, direction, scaredTimer], ...]
+        "food":     [[x, y], ...] cells whose food was eaten (or added)
+        "capsules": [[x, y], ...] capsules eaten
+        "score", "win", "lose"
+
+  server -> bot  {"type": "end", "game": 3, "score": 530, "win": true, "delta": {...}}
+
+Answers whose id is not the one asked for, such as a move that arrives after
+its deadline, are ignored.
+"""
+
+import os, socket, json, errno
+from game import Agent
+from game import Directions
+from eventLoop import EventLoop, Future, Return
+import textDisplay
+
+LINE_LIMIT = 1 << 16 # Longest message a bot may send
+SEND_TIMEOUT = 1.0 # Seconds a bot may leave a message to it unread before it is dropped
+
+class BotDisconnected(Exception):
+    pass
+
+def stateDelta( old, new, height ):
+    """
+    Returns the JSON-ready changes between two GameState.pack() tuples;
+    height is the layout height, for the food bit positions.
+    """
+    oldAgents, newAgents = old[0], new[0]
+    agents = []
+    for i in range( len( newAgents ) ):
+        if newAgents[i] != oldAgents[i]:
+            (x, y), direction, isPacman, scaredTimer = newAgents[i][:4]
+            agents.append( [i, x, y, direction, scaredTimer] )
+    delta = {'agents': agents, 'score': new[3], 'win': new[10], 'lose': new[11]}
+    changed = old[1] ^ new[1]
+    if changed:
+        delta['food'] = _bitCells( changed, height )
+    if old[2] != new[2]:
+        delta['capsules'] = [list( c ) for c in old[2] if c not in new[2]]
+    return delta
+
+def applyDelta( packed, delta, height ):
+    """
+    Returns the GameState.pack() tuple that stateDelta's delta turns packed
+    into.  What only the display uses (the last move, food eaten) is reset.
+    """
+    packed = list( packed )
+    agents = list( packed[0] )
+    for i, x, y, direction, scaredTimer in delta['agents']:
+        pos, oldDirection, isPacman, oldTimer, numCarrying, numReturned = agents[i]
+        agents[i] = ((x, y), direction, isPacman, scaredTimer, numCarrying, numReturned)
+    packed[0] = tuple( agents )
+    for x, y in delta.get( 'food', [] ):
+        packed[1] ^= 1 << (x * height + y)
+    packed[4] = bin( packed[1] ).count( '1' )
+    eaten = [tuple( c ) for c in delta.get( 'capsules', [] )]
+    packed[2] = tuple( [c for c in packed[2] if c not in eaten] )
+    packed[3] = delta['score']
+    packed[5] = tuple( [False for a in agents] )
+    packed[6:10] = [None, None, None, None]
+    packed[10] = delta['win']
+    packed[11] = delta['lose']
+    packed[12] = 0
+    return tuple( packed )
+
+def _bitCells( bits, height ):
+    cells = []
+    i = 0
+    while bits:
+        if bits & 1: cells.append( [i // height, i % height] )
+        bits >>= 1
+        i += 1
+    return cells
+
+def _wouldBlock( error ):
+    return error.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+class BotConnection:
+    """
+    One connected bot: sends it messages and resolves the Future of the
+    question it was last asked when its answer arrives.
+
+    The socket never blocks the event loop.  What the bot has not yet taken
+    is kept in outgoing and written out when the loop reports the socket
+    writable, as answers are read when it is readable.
+    """
+    def __init__( self, loop, sock, name ):
+        self.loop = loop
+        self.sock = sock
+        self.name = name
+        self.buffer = ''
+        self.outgoing = ''
+        self.sendTimer = None
+        self.serial = 0
+        self.pending = None
+        self.closed = False
+        sock.setblocking( False )
+        loop.addReader( sock, self.onReadable )
+
+    def send( self, message ):
+        """
+        Queues message for the bot and writes as much of it as the socket
+        takes now.  A bot that leaves queued bytes unread for SEND_TIMEOUT
+        seconds is disconnected.
+        """
+        if self.closed: raise BotDisconnected( 'Bot %s has disconnected' % self.name )
+        waiting = len( self.outgoing ) > 0
+        self.outgoing += json.dumps( message ) + '\n'
+        if waiting: return # Already waiting for the socket to be writable
+        self.onWritable()
+        if self.closed: raise BotDisconnected( 'Could not send to bot %s' % self.name )
+        if len( self.outgoing ) > 0:
+            self.loop.addWriter( self.sock, self.onWritable )
+            self.sendTimer = self.loop.callLater( SEND_TIMEOUT, self.close )
+
+    def onWritable( self ):
+        try:
+            sent = self.sock.send( self.outgoing )
+        except socket.error, e:
+            if not _wouldBlock( e ): self.close()
+            return
+        self.outgoing = self.outgoing[sent:]
+        if len( self.outgoing ) == 0 and self.sendTimer != None:
+            self.loop.removeWriter( self.sock )
+            self.loop.cancel( self.sendTimer )
+            self.sendTimer = None
+
+    def ask( self, message ):
+        """
+        Sends message with a fresh id and returns a Future for the answer.
+        """
+        self.serial += 1
+        message['id'] = self.serial
+        future = Future()
+        self.pending = (self.serial, future)
+        try:
+            self.send( message )
+        except BotDisconnected, e:
+            self.pending = None
+            future.setException( e )
+        return future
+
+    def onReadable( self ):
+        try:
+            data = self.sock.recv( 65536 )
+        except socket.error, e:
+            if _wouldBlock( e ): return
+            data = ''
+        if data == '':
+            self.close()
+            return
+        self.buffer += data
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split( '\n', 1 )
+            self.onLine( line )
+        if len( self.buffer ) > LINE_LIMIT:
+            self.close()
+
+    def onLine( self, line ):
+        try:
+            answer = json.loads( line )
+        except ValueError:
+            return
+        if self.pending == None or not isinstance( answer, dict ) or answer.get( 'id' ) != self.pending[0]:
+            return # A late answer to an earlier question
+        serial, future = self.pending
+        self.pending = None
+        future.setResult( answer )
+
+    def close( self ):
+        if self.closed: return
+        self.closed = True
+        self.loop.removeReader( self.sock )
+        self.loop.removeWriter( self.sock )
+        if self.sendTimer != None: self.loop.cancel( self.sendTimer )
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+        if self.pending != None:
+            serial, future = self.pending
+            self.pending = None
+            future.setException( BotDisconnected( 'Bot %s has disconnected' % self.name ) )
+
+class RemoteAgent( Agent ):
+    """
+    Plays pacman for a connected bot in one game, sending it state deltas.
+    """
+    def __init__( self, connection, gameNumber, rules ):
+        Agent.__init__( self, 0 )
+        self.connection = connection
+        self.gameNumber = gameNumber
+        self.rules = rules
+        self.lastSent = None
+
+    def delta( self, state ):
+        packed = state.pack()
+        delta = stateDelta( self.lastSent, packed, state.data.layout.height )
+        self.lastSent = packed
+        return delta
+
+    def registerInitialStateAsync( self, state ):
+        self.lastSent = state.pack()
+        layout = state.data.layout
+        message = {'type': 'start', 'game': self.gameNumber, 'layout': layout.layoutText,
+                   'numGhosts': state.getNumAgents() - 1, 'iterations': self.rules.maxIterations,
+                   'moveTimeout': self.rules.getMoveTimeout( 0 )}
+        return self.connection.ask( message )
+
+    def getActionAsync( self, state ):
+        answer = yield self.connection.ask( {'type': 'move', 'delta': self.delta( state )} )
+        action = answer.get( 'action' )
+        if action not in state.getLegalActions( 0 ): action = Directions.STOP
+        raise Return( action )
+
+    def finalAsync( self, state ):
+        self.end( state )
+
+    def end( self, state ):
+        "Tells the bot the game is over, if it is still there."
+        message = {'type': 'end', 'game': self.gameNumber, 'score': state.getScore(),
+                   'win': state.isWin(), 'delta': self.delta( state )}
+        try:
+            self.connection.send( message )
+        except BotDisconnected:
+            pass
+
+def listen( address ):
+    """
+    Opens a listening socket on "host:port", or on a Unix socket path.
+    """
+    if ':' in address:
+        host, port = address.rsplit( ':', 1 )
+        sock = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+        sock.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1 )
+        sock.bind( (host, int( port )) )
+    else:
+        if os.path.exists( address ): os.remove( address )
+        sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        sock.bind( address )
+    sock.listen( 128 )
+    sock.setblocking( False )
+    return sock
+
+def connect( address ):
+    if ':' in address:
+        host, port = address.rsplit( ':', 1 )
+        sock = socket.create_connection( (host, int( port )) )
+        sock.setsockopt( socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 )
+    else:
+        sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        sock.connect( address )
+    return sock
+
+def serveGames( address, layout, ghosts, numGames, rulesArgs, quiet=False, tracer=None ):
+    """
+    Plays numGames games of layout against ghosts for the bots that connect
+    to address, each free bot being handed the next game, and returns the
+    finished Games.  rulesArgs are the ClassicGameRules arguments; each game
+    gets its own rules.  Games are traced with tracer, if given.  A bot that errs, times out or disconnects loses its
+    game; bots that disconnect are not given any more.
+    """
+    from pacman import ClassicGameRules, printSummary
+    loop = EventLoop()
+    server = listen( address )
+    idle = []
+    games = []
+    counts = {'started': 0, 'finished': 0, 'connections': 0}
+    allDone = Future()
+
+    def accept():
+        try:
+            sock, peer = server.accept()
+        except socket.error:
+            return
+        counts['connections'] += 1
+        if sock.family == socket.AF_INET:
+            sock.setsockopt( socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 )
+        idle.append( BotConnection( loop, sock, '#%d' % counts['connections'] ) )
+        schedule()
+
+    def schedule():
+        while len( idle ) > 0 and counts['started'] < numGames:
+            connection = idle.pop( 0 )
+            if connection.closed: continue
+            counts['started'] += 1
+            match = loop.spawn( playMatch( connection, counts['started'] ) )
+            match.addCallback( failed )
+
+    def failed( match ):
+        if match.exception != None: allDone.setException( match.exception, match.excInfo )
+
+    def playMatch( connection, gameNumber ):
+        rules = ClassicGameRules( *rulesArgs )
+        agent = RemoteAgent( connection, gameNumber, rules )
+        game = rules.newGame( layout, agent, ghosts, textDisplay.NullGraphics(), quiet, True )
+        game.tracer = tracer
+        yield loop.spawn( game.runAsync( loop ) )
+        # runAsync skips finalAsync after a crash; the bot still needs to know
+        if game.agentCrashed: agent.end( game.state )
+        games.append( game )
+        counts['finished'] += 1
+        if not connection.closed: idle.append( connection )
+        if counts['finished'] == numGames: allDone.setResult( games )
+        else: schedule()
+
+    loop.addReader( server, accept )
+    print 'Serving %d games on %s' % (numGames, address)
+    try:
+        loop.runUntilComplete( allDone )
+    finally:
+        loop.removeReader( server )
+        server.close()
+        for connection in idle: connection.close()
+        if ':' not in address and os.path.exists( address ): os.remove( address )
+
+    printSummary( [game.state.getScore() for game in games], [game.state.isWin() for game in games] )
+    return games
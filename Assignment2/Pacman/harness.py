@@ -0,0 +1,137 @@
+# harness.py
+# ----------
+# Pieces shared by the batch drivers that play many headless games on a
+# process pool and summarise them in a table (tournament.py, agentBench.py).
+#
+# Move latencies are kept as log-bucketed histograms, so a game's results
+# stay small however long it is, and every driver reads its percentiles off
+# the same buckets: two tools report the same p95 for the same games.
+#
+# A driver hands playGames a function that plays one job and returns its
+# result row (with at least score, win, crashed and latencies), and
+# summarizeGames turns the rows into one table entry per group.
+
+import sys, os, math
+import layout
+
+LATENCY_BUCKET_BASE = 1.05 # Latency histogram resolution (5% per bucket)
+
+def latencyBucket( seconds ):
+    """
+    Index of the histogram bucket holding a latency; bucket k covers
+    (BASE**(k-1), BASE**k] microseconds.
+    """
+    micros = seconds * 1e6
+    if micros <= 1: return 0
+    return int( math.ceil( math.log( micros ) / math.log( LATENCY_BUCKET_BASE ) ) )
+
+def bucketSeconds( bucket ):
+    return LATENCY_BUCKET_BASE ** bucket / 1e6
+
+def addLatency( histogram, seconds ):
+    bucket = latencyBucket( seconds )
+    histogram[bucket] = histogram.get( bucket, 0 ) + 1
+
+def mergeHistograms( histograms ):
+    merged = {}
+    for histogram in histograms:
+        for bucket, count in histogram.items():
+            merged[bucket] = merged.get( bucket, 0 ) + count
+    return merged
+
+def percentile( histogram, fraction ):
+    """
+    Returns the latency (seconds, upper bucket bound) below which the given
+    fraction of the moves in a histogram fall.
+    """
+    total = sum( histogram.values() )
+    if total == 0: return 0.0
+    rank = fraction * total
+    seen = 0
+    for bucket in sorted( histogram.keys() ):
+        seen += histogram[bucket]
+        if seen >= rank:
+            return bucketSeconds( bucket )
+    return bucketSeconds( max( histogram.keys() ) )
+
+def muteWorker():
+    "Agents print; keeps the driver's progress readable from a pool worker."
+    sys.stdout = open( os.devnull, 'w' )
+
+def loadLayout( name, layoutDir ):
+    board = layout.tryToLoad( os.path.join( layoutDir, name + '.lay' ) )
+    if board == None: board = layout.getLayout( name )
+    if board == None: raise Exception("The layout " + name + " cannot be found")
+    return board
+
+def listLayouts( layouts, layoutDir ):
+    """
+    Returns the layout names in a comma separated -l option, where "all"
+    means every layout in layoutDir.
+    """
+    if layouts == 'all':
+        if not os.path.isdir( layoutDir ):
+            raise Exception('The layout directory ' + layoutDir + ' does not exist')
+        return sorted( [f[:-4] for f in os.listdir( layoutDir ) if f.endswith('.lay')] )
+    return layouts.split(',')
+
+def playGames( play, jobs, workers, initializer, initargs, onRow, maxtasksperchild=None ):
+    """
+    Runs play(job) for every job on a pool of worker processes and calls
+    onRow(i, row) with each result as it arrives.  The pool is torn down if
+    anything goes wrong, including an interrupt.
+    """
+    import multiprocessing
+    pool = multiprocessing.Pool( workers, initializer, initargs, maxtasksperchild )
+    try:
+        for i, row in enumerate( pool.imap_unordered( play, jobs ) ):
+            onRow( i, row )
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def gameStatus( row ):
+    if row['crashed']: return 'Crash'
+    return ['Loss', 'Win'][int( row['win'] )]
+
+def printProgress( i, total, description, row ):
+    print '[%d/%d] %s: %s %d' % (i + 1, total, description, gameStatus( row ), row['score'])
+
+def summarizeGames( rows, keys ):
+    """
+    Groups result rows by their values for keys and returns a sorted list of
+    (entry, group) pairs.  Each entry holds the key values, the games,
+    meanScore, winRate, crashes, moves and the p50, p95 and p99 latencies;
+    drivers add their own columns from the group's rows.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault( tuple( [row[key] for key in keys] ), [] ).append( row )
+    summary = []
+    for values, group in sorted( groups.items() ):
+        latencies = mergeHistograms( [row['latencies'] for row in group] )
+        entry = dict( zip( keys, values ) )
+        entry.update( {'games': len( group ),
+                       'meanScore': sum( [row['score'] for row in group] ) / float( len( group ) ),
+                       'winRate': len( [row for row in group if row['win']] ) / float( len( group ) ),
+                       'crashes': len( [row for row in group if row['crashed']] ),
+                       'moves': sum( latencies.values() ),
+                       'p50': percentile( latencies, 0.50 ), 'p95': percentile( latencies, 0.95 ),
+                       'p99': percentile( latencies, 0.99 )} )
+        summary.append( (entry, group) )
+    return summary
+
+def printTable( table, columns, note='', milliseconds=() ):
+    """
+    Prints table, a list of dicts, with columns of (name, header format,
+    cell format).  The columns named in milliseconds hold seconds and are
+    shown in ms.
+    """
+    print ' '.join( [header % name for name, header, cell in columns] ) + note
+    for entry in table:
+        values = dict( entry )
+        for name in milliseconds: values[name] *= 1000
+        print ' '.join( [cell % values[name] for name, header, cell in columns] )
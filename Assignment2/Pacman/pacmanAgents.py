@@ -20,6 +20,7 @@
 
 from pacman import Directions
 from game import Agent
+from game import MoveBudget
 from heuristics import *
 import random
 import math
@@ -311,16 +312,22 @@ class MCTSAgent(Agent):
 
     # GetAction Function: Called with every frame
     def getAction(self, state):
+        return self.getActionAnytime(state, MoveBudget())
+
+    # Anytime version: search until the budget runs out, reporting the most
+    # visited child so the game can play it if the move deadline fires
+    def getActionAnytime(self, state, budget):
         root = Node(None, state)
         self.rootstate = state
         self.exceed_limit = False
-        while not self.exceed_limit:
+        while not self.exceed_limit and budget.timeLeft() > 0:
             new_node = self.treePolicy(root, self.rootstate)
             # Check if exceed the limit
             if self.exceed_limit:
                 break
             node, reward = self.defaultPolicy(new_node)
             self.backup(node, reward)
+            budget.report(max(root.children, key=lambda child: child.visited_count).action)
 
         best_child = None
         largest_count = -1
@@ -332,6 +339,11 @@ class MCTSAgent(Agent):
             # If it's tie, randomly choose one
             elif child.visited_count == largest_count and random.randint(0,1):
                 best_child = child
+        # No time or forward model calls for a single iteration
+        if best_child is None:
+            if budget.bestAction is not None:
+                return budget.bestAction
+            return random.choice(state.getLegalPacmanActions())
         return best_child.action
 
     def treePolicy(self, node, rootstate):
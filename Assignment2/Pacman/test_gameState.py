@@ -0,0 +1,372 @@
+# test_gameState.py
+# -----------------
+# Regression tests for the game engine's GameState.
+#
+# Run with:  python -m unittest discover -p 'test_*.py'
+
+import unittest, random, os, sys, time, shutil, tempfile, threading, StringIO
+import layout, pacman, textDisplay, ghostAgents, util
+from game import Actions, Agent, Configuration, Directions, SimulationBudget, ZobristTable
+
+MEDIUM_CLASSIC = ['%%%%%%%%%%%%%%%%%%%%',
+                  '%o...%........%....%',
+                  '%.%%.%.%%%%%%.%.%%.%',
+                  '%.%..............%.%',
+                  '%.%.%%.%%  %%.%%.%.%',
+                  '%......%G  G%......%',
+                  '%.%.%%.%%%%%%.%%.%.%',
+                  '%.%..............%.%',
+                  '%.%%.%.%%%%%%.%.%%.%',
+                  '%....%...P....%...o%',
+                  '%%%%%%%%%%%%%%%%%%%%']
+
+class StopAgent( Agent ):
+    def getAction( self, state ):
+        return 'Stop'
+
+def initialState():
+    state = pacman.GameState()
+    state.initialize( layout.Layout( MEDIUM_CLASSIC ), 2 )
+    return state
+
+def randomPlay( state, steps, seed ):
+    "Yields the states of up to steps random pacman moves from state."
+    random.seed( seed )
+    for i in range( steps ):
+        if state.isWin() or state.isLose(): return
+        actions = state.getLegalPacmanActions() or [Directions.STOP]
+        state = state.generatePacmanSuccessor( random.choice( actions ) )
+        yield state
+
+class PrintingAgent( Agent ):
+    def getAction( self, state ):
+        print 'pacman at', state.getPacmanPosition()
+        return 'Stop'
+
+def snapshot( state ):
+    "Everything an agent can see of a state, as plain values."
+    return (str( state ), state.key(), hash( state ), state.getFood().asList(), state.getCapsules()[:],
+            [(g.getPosition(), g.scaredTimer) for g in state.getGhostStates()], state.getScore(),
+            state.isWin(), state.isLose())
+
+def newGame( pacmanAgent, agentLog=None ):
+    board = layout.Layout( MEDIUM_CLASSIC )
+    ghosts = [ghostAgents.RandomGhost( i+1 ) for i in range( board.getNumGhosts() )]
+    rules = pacman.ClassicGameRules()
+    return rules.newGame( board, pacmanAgent, ghosts, textDisplay.NullGraphics(), True, agentLog=agentLog )
+
+class ConfigurationTest( unittest.TestCase ):
+
+    def testPacmanStaysOnIntegerPositions( self ):
+        for seed in range( 10 ):
+            for state in randomPlay( initialState(), 200, seed ):
+                x, y = state.getPacmanPosition()
+                self.assertTrue( type( x ) is int and type( y ) is int, (seed, x, y) )
+                state.hasFood( x, y )
+                state.getWalls()[x][y]
+
+    def testInterningKeepsPositionTypes( self ):
+        table = {}
+        exact = Configuration( (13, 3), Directions.EAST, table )
+        self.assertTrue( Configuration( (13, 3), Directions.EAST, table ) is exact )
+        self.assertFalse( Configuration( (13.0, 3.0), Directions.EAST, table ) is exact )
+        self.assertEqual( type( Configuration( (12.0, 3.0), Directions.EAST, table ).generateSuccessor( (1, 0) ).pos[0] ), float )
+        self.assertEqual( type( Configuration( (12, 3), Directions.EAST, table ).generateSuccessor( (1.0, 0.0) ).pos[0] ), float )
+        self.assertEqual( type( exact.generateSuccessor( (1, 0) ).pos[0] ), int )
+
+    def testTablesArePerLayout( self ):
+        small = layout.Layout( ['%%%%%', '%P G%', '%%%%%'] )
+        medium = layout.Layout( MEDIUM_CLASSIC )
+        self.assertTrue( Configuration.getTable( medium ) is Configuration.getTable( layout.Layout( MEDIUM_CLASSIC ) ) )
+        self.assertFalse( Configuration.getTable( small ) is Configuration.getTable( medium ) )
+
+class ActionTableTest( unittest.TestCase ):
+
+    def testTablesMatchGetPossibleActions( self ):
+        layoutDir = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), 'layouts' )
+        names = [name for name in os.listdir( layoutDir ) if name.endswith( '.lay' )]
+        self.assertTrue( len( names ) > 0 )
+        headings = [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST, Directions.STOP]
+        for name in names:
+            board = layout.tryToLoad( os.path.join( layoutDir, name ) )
+            for x in range( board.width ):
+                for y in range( board.height ):
+                    if board.walls[x][y]: continue
+                    for heading in headings:
+                        possible = Actions.getPossibleActions( Configuration( (x, y), heading ), board.walls )
+                        self.assertEqual( list( board.pacmanActions[(x, y)] ), possible, (name, x, y) )
+                        # What GhostRules.getLegalActions computes off the grid
+                        ghost = [action for action in possible if action != Directions.STOP]
+                        reverse = Actions.reverseDirection( heading )
+                        if reverse in ghost and len( ghost ) > 1: ghost.remove( reverse )
+                        self.assertEqual( list( board.ghostActions[((x, y), heading)] ), ghost, (name, x, y, heading) )
+
+class FoodCountTest( unittest.TestCase ):
+
+    def setUp( self ):
+        self.debugFoodCount = pacman.DEBUG_FOOD_COUNT
+        pacman.DEBUG_FOOD_COUNT = True
+
+    def tearDown( self ):
+        pacman.DEBUG_FOOD_COUNT = self.debugFoodCount
+
+    def testCachedCountFollowsPlay( self ):
+        # With the cross-check on, every getNumFood the rules make compares against the grid
+        for seed in range( 10 ):
+            for state in randomPlay( initialState(), 300, seed ):
+                self.assertEqual( state.getNumFood(), state.getFood().count() )
+            random.seed( seed )
+            state = initialState()
+            records = []
+            while len( records ) < 100 and not (state.isWin() or state.isLose()):
+                records.append( state.apply( random.choice( state.getLegalPacmanActions() ) ) )
+                self.assertEqual( state.getNumFood(), state.getFood().count() )
+            for record in reversed( records ):
+                state.undo( record )
+                self.assertEqual( state.getNumFood(), state.getFood().count() )
+
+    def testCrossCheckCatchesADriftedCount( self ):
+        state = initialState()
+        state.data.numFood += 1
+        self.assertRaises( Exception, state.getNumFood )
+        pacman.DEBUG_FOOD_COUNT = False
+        self.assertEqual( state.getNumFood(), state.getFood().count() + 1 )
+
+class YieldingRandom( random.Random ):
+    "Lets other threads run while it draws, as a busy interpreter might."
+    def getrandbits( self, k ):
+        time.sleep( 0.0001 )
+        return random.Random.getrandbits( self, k )
+
+class ZobristTest( unittest.TestCase ):
+
+    def assertKeyIsCurrent( self, state ):
+        self.assertEqual( state.data._hashKey, state.data._zobrist.hashKey( state.data ) )
+
+    def testIncrementalKeyFollowsRandomPlay( self ):
+        for seed in range( 10 ):
+            for state in randomPlay( initialState(), 300, seed ):
+                self.assertKeyIsCurrent( state )
+
+    def testIncrementalKeyFollowsCapsulesAndEatenGhosts( self ):
+        ghostsEaten = 0
+        for seed in range( 10 ):
+            random.seed( seed )
+            state = pacman.GameState()
+            state.initialize( layout.Layout( ['%%%%%%%', '%Po..G%', '%%%%%%%'] ), 1 )
+            while not (state.isWin() or state.isLose()):
+                state = state.generatePacmanSuccessor( Directions.EAST )
+                self.assertKeyIsCurrent( state )
+                if state.data._eaten[1]: ghostsEaten += 1
+        self.assertTrue( ghostsEaten > 0 )
+
+    def testThreadsDrawTheSameKeys( self ):
+        table = ZobristTable()
+        table._random = YieldingRandom( ZobristTable.SEED )
+        pieces = [(x, y) for x in range( 10 ) for y in range( 10 )]
+        seen = []
+        def draw():
+            seen.append( [table.foodKey( piece ) for piece in pieces] )
+        threads = [threading.Thread( target=draw ) for i in range( 8 )]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        for keys in seen:
+            self.assertEqual( keys, seen[0] )
+        self.assertEqual( len( set( seen[0] ) ), len( pieces ) )
+
+class CopyOnWriteTest( unittest.TestCase ):
+
+    def testSuccessorsLeaveTheirPredecessorsAlone( self ):
+        for seed in range( 5 ):
+            states = [initialState()] + list( randomPlay( initialState(), 150, seed ) )
+            before = [snapshot( state ) for state in states]
+            # Siblings of every state on the path, which share its food, capsules and agents
+            for state in states:
+                if state.isWin() or state.isLose(): continue
+                for action in state.getLegalPacmanActions():
+                    for successor in randomPlay( state.generatePacmanSuccessor( action ), 20, seed ):
+                        pass
+            self.assertEqual( [snapshot( state ) for state in states], before, seed )
+
+    def testScaredTimersAreNotShared( self ):
+        random.seed( 0 )
+        state = pacman.GameState()
+        state.initialize( layout.Layout( ['%%%%%%%%%', '%Po....G%', '%%%%%%%%%'] ), 1 )
+        scared = state.generatePacmanSuccessor( Directions.EAST )
+        timer = scared.getGhostState( 1 ).scaredTimer
+        self.assertTrue( timer > 0 )
+        self.assertEqual( state.getGhostState( 1 ).scaredTimer, 0 )
+        self.assertEqual( len( state.getCapsules() ), 1 )
+        scared.generatePacmanSuccessor( Directions.EAST )
+        self.assertEqual( scared.getGhostState( 1 ).scaredTimer, timer )
+
+class ApplyUndoTest( unittest.TestCase ):
+
+    def testUndoRestoresEveryStateOnThePath( self ):
+        for seed in range( 10 ):
+            random.seed( seed )
+            state = initialState()
+            path = []
+            while len( path ) < 150 and not (state.isWin() or state.isLose()):
+                before = snapshot( state )
+                path.append( (state.apply( random.choice( state.getLegalPacmanActions() ) ), before) )
+            # The hash key kept up by the rules matches one computed from scratch
+            self.assertEqual( state.data._hashKey, state.data._zobrist.hashKey( state.data ) )
+            for record, before in reversed( path ):
+                state.undo( record )
+                self.assertEqual( snapshot( state ), before, seed )
+
+    def testApplyMatchesGeneratePacmanSuccessor( self ):
+        for seed in range( 10 ):
+            generated = list( randomPlay( initialState(), 150, seed ) )
+            # Replays the same random choices, pacman's and the ghosts', in place
+            random.seed( seed )
+            state = initialState()
+            for successor in generated:
+                state.apply( random.choice( state.getLegalPacmanActions() or [Directions.STOP] ) )
+                self.assertEqual( snapshot( state ), snapshot( successor ), seed )
+                self.assertEqual( state.key(), successor.key() )
+                self.assertTrue( state == successor )
+
+    def testApplyCountsAgainstTheBudget( self ):
+        game = newGame( StopAgent() )
+        state = pacman.GameState( game.observe( 0 ) )
+        state.budget = SimulationBudget( 3 ) # Allows 2 calls
+        first = state.apply( Directions.WEST )
+        self.assertTrue( first is not None )
+        self.assertTrue( state.generatePacmanSuccessor( Directions.EAST ) is not None )
+        self.assertTrue( state.apply( Directions.EAST ) is None )
+        self.assertEqual( state.budget.report(), (2, 3, 3) )
+        state.undo( first )
+
+class KeyTest( unittest.TestCase ):
+
+    def testKeysAreEqualExactlyWhenStatesAre( self ):
+        states = [initialState()]
+        for seed in range( 6 ):
+            states.extend( randomPlay( initialState(), 40, seed ) )
+        for a in states:
+            for b in states:
+                self.assertEqual( a.key() == b.key(), a == b )
+                if a == b: self.assertEqual( hash( a ), hash( b ) )
+
+class ObservationTest( unittest.TestCase ):
+
+    def testMutatingAnObservationLeavesTheGameAlone( self ):
+        game = newGame( StopAgent() )
+        live = game.state
+        before = (str( live ), live.key(), hash( live ))
+        observation = game.observe( 0 )
+        for ghostState in observation.getGhostStates():
+            ghostState.scaredTimer = 40
+        observation.getGhostState( 1 ).configuration = observation.getPacmanState().configuration
+        del observation.getCapsules()[:]
+        observation.getFood()[1][1] = False
+
+        self.assertEqual( [g.scaredTimer for g in live.getGhostStates()], [0, 0] )
+        self.assertEqual( len( live.getCapsules() ), 2 )
+        self.assertTrue( live.hasFood( 1, 1 ) )
+        self.assertEqual( (str( live ), live.key(), hash( live )), before )
+        # The cached hash key still matches one computed from scratch
+        self.assertEqual( live.data._hashKey, live.data._zobrist.hashKey( live.data ) )
+
+    def testObservationsCannotApplyOrUndo( self ):
+        observation = newGame( StopAgent() ).observe( 0 )
+        self.assertRaises( Exception, observation.apply, 'West' )
+        self.assertRaises( Exception, observation.undo, None )
+
+class TaggedAgent( Agent ):
+    "Prints its tag every move, letting other threads run in between."
+    def __init__( self, tag ):
+        Agent.__init__( self )
+        self.tag = tag
+
+    def getAction( self, state ):
+        print self.tag,
+        time.sleep( 0.001 )
+        print 'moves'
+        return 'Stop'
+
+class WanderingAgent( Agent ):
+    def getAction( self, state ):
+        return random.choice( state.getLegalPacmanActions() )
+
+def captureOutput( function, *args, **keyArgs ):
+    "Returns function's result and what it printed."
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    try:
+        result = function( *args, **keyArgs )
+        return result, sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+class ParallelGamesTest( unittest.TestCase ):
+
+    def testWorkersMatchASerialRunUnderTheSameSeeds( self ):
+        if not hasattr( os, 'fork' ): return
+        board = layout.Layout( MEDIUM_CLASSIC )
+        ghosts = [ghostAgents.RandomGhost( i+1 ) for i in range( board.getNumGhosts() )]
+        random.seed( 3 )
+        results, output = captureOutput( pacman.runGames, board, WanderingAgent(), ghosts,
+                                         textDisplay.NullGraphics(), 6, workers=3 )
+        # The same games one after another: runGamesInParallel draws a seed per game
+        random.seed( 3 )
+        seeds = [random.randint( 0, sys.maxint ) for i in range( 6 )]
+        games = []
+        for seed in seeds:
+            random.seed( seed )
+            game = pacman.ClassicGameRules().newGame( board, WanderingAgent(), ghosts, textDisplay.NullGraphics(), True )
+            game.run()
+            games.append( game )
+        self.assertEqual( [(result.score, result.win) for result in results],
+                          [(game.state.getScore(), game.state.isWin()) for game in games] )
+        summary = captureOutput( pacman.printSummary, [game.state.getScore() for game in games],
+                                 [game.state.isWin() for game in games] )[1]
+        self.assertTrue( output.endswith( summary ) )
+
+class AgentLogTest( unittest.TestCase ):
+
+    def testAgentLogGetsWhatTheAgentPrints( self ):
+        directory = tempfile.mkdtemp()
+        try:
+            random.seed( 0 )
+            game = newGame( PrintingAgent(), pacman.agentLogPath( directory, 0 ) )
+            game.run()
+            f = open( os.path.join( directory, 'game-0.log' ) )
+            try: logged = f.read()
+            finally: f.close()
+        finally:
+            shutil.rmtree( directory )
+        moves = len( [move for move in game.moveHistory if move[0] == 0] )
+        self.assertEqual( logged, 'pacman at (9, 1)\n' * moves )
+        self.assertTrue( logged.endswith( game.agentOutput[0].getvalue() ) )
+        self.assertTrue( game.outputLogFile is None )
+
+    def testGamesOnThreadsKeepTheirOutputApart( self ):
+        directory = tempfile.mkdtemp()
+        console = StringIO.StringIO()
+        util.redirectOutput( console )
+        try:
+            random.seed( 0 )
+            games = [newGame( TaggedAgent( tag ), pacman.agentLogPath( directory, i ) ) for i, tag in enumerate( ['red', 'blue'] )]
+            threads = [threading.Thread( target=game.run ) for game in games]
+            for thread in threads: thread.start()
+            for thread in threads: thread.join()
+            logged = []
+            for i in range( len( games ) ):
+                f = open( os.path.join( directory, 'game-%d.log' % i ) )
+                try: logged.append( f.read() )
+                finally: f.close()
+        finally:
+            util.restoreOutput()
+            shutil.rmtree( directory )
+        for game, tag, log in zip( games, ['red', 'blue'], logged ):
+            moves = len( [move for move in game.moveHistory if move[0] == 0] )
+            self.assertTrue( moves > 0 )
+            self.assertEqual( log, ('%s moves\n' % tag) * moves )
+            self.assertTrue( log.endswith( game.agentOutput[0].getvalue() ) )
+        self.assertEqual( console.getvalue(), '' )
+
+if __name__ == '__main__':
+    unittest.main()
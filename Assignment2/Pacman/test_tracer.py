@@ -0,0 +1,80 @@
+# test_tracer.py
+# --------------
+# Regression tests for the per-move tracing of games (tracer.py).
+#
+# Run with:  python -m unittest discover -p 'test_*.py'
+
+import unittest, random, os, json, tempfile
+import tracer
+from test_gameState import newGame
+from test_agentHost import RandomLookAheadAgent
+
+def tracedGame( tracing, seed ):
+    random.seed( seed )
+    game = newGame( RandomLookAheadAgent() )
+    game.tracer = tracing
+    game.run()
+    return game
+
+class TracerTest( unittest.TestCase ):
+
+    def testEventsCoverEveryTurn( self ):
+        game = tracedGame( tracer.Tracer(), 0 )
+        events = game.trace.events
+        numAgents = len( game.agents )
+        for event in events:
+            self.assertEqual( (event['ph'], event['pid']), ('X', 1) )
+            self.assertTrue( event['ts'] >= 0 and event['dur'] >= 0 )
+        self.assertEqual( [event['ts'] for event in events], sorted( [event['ts'] for event in events] ) )
+        for agentIndex in range( numAgents ):
+            moves = len( [move for move in game.moveHistory if move[0] == agentIndex] )
+            for name in ['getAction', 'generateSuccessor']:
+                steps = [event for event in events if event['tid'] == agentIndex and event['name'] == name]
+                self.assertEqual( len( steps ), moves, (agentIndex, name) )
+            starts = [event for event in events if event['tid'] == agentIndex and event['name'] == 'registerInitialState']
+            self.assertEqual( len( starts ), 1 )
+        updates = [event for event in events if event['name'] == 'update']
+        self.assertEqual( [event['tid'] for event in updates], [numAgents] * len( game.moveHistory ) )
+        # Forward model calls are charged to the pacman moves that made them
+        simulations = [event['args']['simulations'] for event in events if event['tid'] == 0 and event['name'] == 'getAction']
+        self.assertEqual( simulations, [granted for granted, spent, limit in game.simulationReports] )
+        self.assertTrue( sum( simulations ) > 0 )
+
+    def testSummaryTotalsTheEvents( self ):
+        game = tracedGame( tracer.Tracer(), 1 )
+        rows = game.trace.summary()
+        self.assertEqual( len( rows ), len( set( [(event['tid'], event['name']) for event in game.trace.events] ) ) )
+        for row in rows:
+            steps = [event for event in game.trace.events
+                     if game.trace.threadName( event['tid'] ) == row['thread'] and event['name'] == row['step']]
+            self.assertEqual( row['game'], 1 )
+            self.assertEqual( row['count'], len( steps ) )
+            self.assertEqual( row['simulations'], sum( [event['args'].get( 'simulations', 0 ) for event in steps] ) )
+            # Events are rounded down to whole microseconds
+            self.assertTrue( 0 <= row['wall'] * 1e6 - sum( [event['dur'] for event in steps] ) <= len( steps ) )
+            self.assertTrue( 0 <= row['max'] * 1e6 - max( [event['dur'] for event in steps] ) <= 1 )
+
+    def testWriteGivesOneProcessPerGame( self ):
+        tracing = tracer.Tracer()
+        games = [tracedGame( tracing, seed ) for seed in range( 2 )]
+        handle, fileName = tempfile.mkstemp( '.json' )
+        os.close( handle )
+        try:
+            tracing.write( fileName )
+            f = open( fileName )
+            try: written = json.load( f )
+            finally: f.close()
+        finally:
+            os.remove( fileName )
+        events = written['traceEvents']
+        names = dict( [((event['pid'], event.get( 'tid' )), event['args']['name']) for event in events if event['ph'] == 'M'] )
+        self.assertEqual( names[(1, None)], 'game 1' )
+        self.assertEqual( names[(2, None)], 'game 2' )
+        self.assertEqual( [names[(2, tid)] for tid in range( 4 )], ['pacman', 'ghost 1', 'ghost 2', 'display'] )
+        for number, game in enumerate( games ):
+            self.assertEqual( len( [event for event in events if event['ph'] == 'X' and event['pid'] == number + 1] ),
+                              len( game.trace.events ) )
+        self.assertEqual( written['otherData']['games'], [json.loads( json.dumps( game.trace.summary() ) ) for game in games] )
+
+if __name__ == '__main__':
+    unittest.main()
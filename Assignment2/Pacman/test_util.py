@@ -0,0 +1,79 @@
+# test_util.py
+# ------------
+# Regression tests for util.py.
+#
+# Run with:  python -m unittest discover -p 'test_*.py'
+
+import unittest, os, cStringIO
+import util
+from util import TimeoutFunction, TimeoutFunctionException, monotonicTime
+
+def spin( seconds ):
+    end = monotonicTime() + seconds
+    while monotonicTime() < end:
+        pass
+    return seconds
+
+class WatchdogTest( unittest.TestCase ):
+
+    def testSubSecondTimeoutFires( self ):
+        start = monotonicTime()
+        self.assertRaises( TimeoutFunctionException, TimeoutFunction( spin, 0.05 ), 5 )
+        self.assertTrue( monotonicTime() - start < 1.0 )
+
+    def testFunctionInTimeReturns( self ):
+        self.assertEqual( TimeoutFunction( spin, 1.0 )( 0.01 ), 0.01 )
+
+    def testDeadlinesAtTheFinishLineLeaveNothingBehind( self ):
+        # Functions that end just as their deadline passes race the watchdog
+        # through disarm; whoever wins, no record of the deadline may remain
+        timeouts = 0
+        for i in range( 300 ):
+            try:
+                TimeoutFunction( spin, 0.002 )( 0.002 )
+            except TimeoutFunctionException:
+                timeouts += 1
+        watchdog = util._watchdog()
+        spin( 0.05 )
+        self.assertEqual( watchdog.armed, {} )
+        self.assertEqual( watchdog.deadlines, [] )
+        self.assertTrue( timeouts > 0 )
+
+    def testForkedChildGetsItsOwnWatchdog( self ):
+        if not hasattr( os, 'fork' ): return
+        TimeoutFunction( spin, 1.0 )( 0.001 ) # Starts this process's watchdog thread
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                try:
+                    TimeoutFunction( spin, 0.05 )( 5 )
+                except TimeoutFunctionException:
+                    if util._watchdog().pid == os.getpid(): status = 0
+            finally:
+                os._exit( status )
+        waited, status = os.waitpid( pid, 0 )
+        self.assertEqual( status, 0 )
+
+class OutputBufferTest( unittest.TestCase ):
+
+    def testKeepsTheLatestOutput( self ):
+        output = util.OutputBuffer( 10 )
+        total = 0
+        for i in range( 100 ):
+            output.write( '%d\n' % i )
+            total += len( '%d\n' % i )
+        self.assertEqual( output.getvalue(), '\n97\n98\n99\n' )
+        self.assertEqual( output.truncated, total - 10 )
+        output.write( 'x' * 25 )
+        self.assertEqual( output.getvalue(), 'x' * 10 )
+        self.assertEqual( output.truncated, total + 25 - 10 )
+
+    def testLogGetsEverything( self ):
+        log = cStringIO.StringIO()
+        output = util.OutputBuffer( 10, log )
+        output.writelines( ['%d\n' % i for i in range( 100 )] )
+        self.assertEqual( log.getvalue(), ''.join( ['%d\n' % i for i in range( 100 )] ) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+# bench.py
+# --------
+# Micro-benchmarks of the game engine on every layout.
+#
+# For each layout, bench.py times loading it, generatePacmanSuccessor under
+# random play, getLegalActions, hashing and comparing states and deepCopy.
+# Every layout is played from the same seed, and the results are written to
+# JSON along with the machine and Python they were measured on, so runs
+# from before and after an engine change can be compared.
+#
+# Only the public GameState API is timed, so bench.py and harness.py can be
+# copied into an older tree of the engine and measure it the same way.
+
+"""
+USAGE:      python bench.py <options>
+EXAMPLES:   (1) python bench.py
+                - benchmarks every layout in layouts/ and writes bench.json
+            (2) python bench.py -l mediumClassic,originalClassic -o before.json
+            (3) python bench.py --layoutDir ../../Assignment1/pacman/layouts
+"""
+
+import sys, os, time, random, json, platform
+import layout, game
+from game import Directions
+from pacman import GameState, default
+from harness import listLayouts
+try:
+    from util import monotonicTime
+except ImportError:
+    monotonicTime = time.time # Trees from before the monotonic clock
+
+def timeBest( function, repeat ):
+    "Returns the fewest seconds function() took in repeat runs."
+    best = None
+    for i in range( repeat ):
+        start = monotonicTime()
+        function()
+        seconds = monotonicTime() - start
+        if best == None or seconds < best: best = seconds
+    return best
+
+def randomPlay( initial, steps ):
+    """
+    Plays steps random pacman moves, ghosts moving at random too, starting
+    over whenever a game ends, and returns the states visited.
+    """
+    # Older engines count forward model calls against one global -i limit
+    if hasattr( game.Game, 'currentIterations' ): game.Game.currentIterations = sys.maxint
+    states = []
+    state = initial
+    while len( states ) < steps:
+        actions = state.getLegalPacmanActions()
+        if len( actions ) == 0: actions = [Directions.STOP]
+        state = state.generatePacmanSuccessor( random.choice( actions ) )
+        states.append( state )
+        if state.isWin() or state.isLose(): state = initial
+    return states
+
+def benchLayout( fileName, seed, steps, repeat ):
+    """
+    Returns the benchmarks of the layout in fileName: rates are per second
+    and costs in microseconds, each the best of repeat runs.
+    """
+    board = layout.tryToLoad( fileName )
+    initial = GameState()
+    initial.initialize( board, board.getNumGhosts() )
+    numAgents = initial.getNumAgents()
+
+    loads = max( 1, steps / 100 )
+    def load():
+        for i in range( loads ):
+            layout.tryToLoad( fileName )
+    def play():
+        random.seed( seed )
+        randomPlay( initial, steps )
+
+    random.seed( seed )
+    states = randomPlay( initial, steps )
+    live = [state for state in states if not (state.isWin() or state.isLose())]
+    copies = [state.deepCopy() for state in states]
+    def legal():
+        for state in live:
+            for agentIndex in range( numAgents ):
+                state.getLegalActions( agentIndex )
+    def hashes():
+        for state in states:
+            hash( state )
+    def equals():
+        for state, copy in zip( states, copies ):
+            state == copy
+    def deepCopies():
+        for state in states:
+            state.deepCopy()
+
+    return {'width': board.width, 'height': board.height, 'ghosts': numAgents - 1,
+            'food': initial.getNumFood(),
+            'layoutLoadUs': timeBest( load, repeat ) / loads * 1e6,
+            'successorsPerSecond': steps / timeBest( play, repeat ),
+            'legalActionsPerSecond': len( live ) * numAgents / timeBest( legal, repeat ),
+            'hashesPerSecond': len( states ) / timeBest( hashes, repeat ),
+            'equalsPerSecond': len( states ) / timeBest( equals, repeat ),
+            'deepCopyUs': timeBest( deepCopies, repeat ) / len( states ) * 1e6}
+
+def machineInfo():
+    import multiprocessing
+    return {'platform': platform.platform(), 'machine': platform.machine(), 'processor': platform.processor(),
+            'cpus': multiprocessing.cpu_count(), 'python': platform.python_version(),
+            'implementation': platform.python_implementation(), 'node': platform.node()}
+
+def runBenchmarks( layoutDir, layouts, seed, steps, repeat ):
+    results = {}
+    print '%-22s %12s %12s %12s %12s %10s %10s' % ('layout', 'successors/s', 'legal/s', 'hash/s', 'eq/s',
+                                                   'copy (us)', 'load (us)')
+    for name in layouts:
+        result = benchLayout( os.path.join( layoutDir, name + '.lay' ), seed, steps, repeat )
+        results[name] = result
+        print '%-22s %12.0f %12.0f %12.0f %12.0f %10.1f %10.1f' % (name, result['successorsPerSecond'],
+                result['legalActionsPerSecond'], result['hashesPerSecond'], result['equalsPerSecond'],
+                result['deepCopyUs'], result['layoutLoadUs'])
+    return results
+
+def readCommand( argv ):
+    from optparse import OptionParser
+    parser = OptionParser( __doc__ )
+    parser.add_option('-l', '--layouts', dest='layouts',
+                      help=default('Comma separated LAYOUTs, or "all" for every layout in the layout directory'), default='all')
+    parser.add_option('--layoutDir', dest='layoutDir',
+                      help=default('Directory holding the .lay files'), default='layouts')
+    parser.add_option('-s', '--seed', type='int', dest='seed',
+                      help=default('Random seed for the random play on every layout'), default=0)
+    parser.add_option('-n', '--steps', type='int', dest='steps',
+                      help=default('Random pacman moves (generatePacmanSuccessor calls) per layout'), default=2000)
+    parser.add_option('-r', '--repeat', type='int', dest='repeat',
+                      help=default('Times each benchmark is run; the fastest run counts'), default=3)
+    parser.add_option('-o', '--output', dest='output',
+                      help=default('JSON file to write the results to'), default='bench.json')
+
+    options, otherjunk = parser.parse_args( argv )
+    if len( otherjunk ) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options, listLayouts( options.layouts, options.layoutDir )
+
+if __name__ == '__main__':
+    options, layouts = readCommand( sys.argv[1:] )
+    start = time.time()
+    results = runBenchmarks( options.layoutDir, layouts, options.seed, options.steps, options.repeat )
+    report = {'machine': machineInfo(), 'started': time.strftime( '%Y-%m-%dT%H:%M:%S', time.localtime( start ) ),
+              'seconds': time.time() - start, 'seed': options.seed, 'steps': options.steps,
+              'repeat': options.repeat, 'layouts': results}
+    f = open( options.output, 'w' )
+    try: json.dump( report, f, indent=2, sort_keys=True )
+    finally: f.close()
+    print 'Wrote %d layouts to %s' % (len( results ), options.output)
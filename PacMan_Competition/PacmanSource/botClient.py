@@ -0,0 +1,101 @@
+# botClient.py
+# ------------
+# The reference bot for the game server (see gameServer.py).
+#
+# Connects to a server started with pacman.py --serve and plays every game it
+# is given with an ordinary pacman agent.  The client rebuilds a full
+# GameState from the deltas the server sends, so any agent that plays locally
+# plays here unchanged, forward model included.
+
+"""
+USAGE:      python pacman.py --serve 127.0.0.1:7777 -n 10 -c --moveTimeout 0.1 &
+            python botClient.py --connect 127.0.0.1:7777 -p MCTSAgent
+"""
+
+import sys, json, socket
+import layout
+from game import SimulationBudget
+from pacman import GameState, loadAgent, parseAgentArgs
+from gameServer import connect, applyDelta
+
+class BotClient:
+    """
+    Plays the games a server hands out with agent, over sock, until the
+    server hangs up.  Returns the number of games played.
+    """
+    def __init__( self, sock, agent ):
+        self.sock = sock
+        self.agent = agent
+        self.reader = sock.makefile( 'r' )
+        self.initialStates = {}
+        self.initial = None
+        self.packed = None
+        self.iterations = None
+        self.gamesPlayed = 0
+
+    def send( self, message ):
+        self.sock.sendall( json.dumps( message ) + '\n' )
+
+    def play( self ):
+        try:
+            while True:
+                line = self.reader.readline()
+                if line == '': break
+                self.handle( json.loads( line ) )
+        except socket.error:
+            pass # The server went away mid-message
+        return self.gamesPlayed
+
+    def handle( self, message ):
+        kind = message['type']
+        if kind == 'start':
+            self.start( message )
+            self.send( {'id': message['id']} )
+        elif kind == 'move':
+            action = self.agent.getAction( self.update( message['delta'] ) )
+            self.send( {'id': message['id'], 'action': action} )
+        elif kind == 'end':
+            state = self.update( message['delta'] )
+            if 'final' in dir( self.agent ): self.agent.final( state )
+            self.gamesPlayed += 1
+
+    def start( self, message ):
+        key = (tuple( message['layout'] ), message['numGhosts'])
+        if key not in self.initialStates:
+            initial = GameState()
+            initial.initialize( layout.Layout( message['layout'] ), message['numGhosts'] )
+            self.initialStates[key] = initial
+        self.initial = self.initialStates[key]
+        self.packed = self.initial.pack()
+        self.iterations = message['iterations']
+        if 'registerInitialState' in dir( self.agent ):
+            self.agent.registerInitialState( self.state() )
+
+    def update( self, delta ):
+        self.packed = applyDelta( self.packed, delta, self.initial.data.layout.height )
+        return self.state()
+
+    def state( self ):
+        state = self.initial.unpack( self.packed )
+        state.budget = SimulationBudget( self.iterations )
+        return state
+
+def readCommand( argv ):
+    from optparse import OptionParser
+    parser = OptionParser( __doc__ )
+    parser.add_option( '--connect', dest='address', metavar='ADDRESS',
+                       help='The server\'s host:port or Unix socket path [Default: %default]', default='127.0.0.1:7777' )
+    parser.add_option( '-p', '--pacman', dest='pacman',
+                       help='The agent TYPE in the pacmanAgents module to play with [Default: %default]', default='RandomAgent' )
+    parser.add_option( '-a', '--agentArgs', dest='agentArgs',
+                       help='Comma separated values sent to the agent. e.g. "opt1=val1,opt2,opt3=val3"' )
+    options, otherjunk = parser.parse_args( argv )
+    if len( otherjunk ) != 0:
+        raise Exception( 'Command line input not understood: ' + str( otherjunk ) )
+    return options
+
+if __name__ == '__main__':
+    options = readCommand( sys.argv[1:] )
+    agent = loadAgent( options.pacman, True )( **parseAgentArgs( options.agentArgs ) )
+    client = BotClient( connect( options.address ), agent )
+    print 'Played %d games' % client.play()
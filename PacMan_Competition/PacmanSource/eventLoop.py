@@ -0,0 +1,267 @@
+# eventLoop.py
+# ------------
+# A small single-threaded event loop for playing many games at once.
+#
+# Python 2 has no asyncio, so this provides the few pieces Game.runAsync
+# needs: Futures, generator coroutines that yield Futures, timers and
+# waiting for sockets to become readable or writable.  One EventLoop can multiplex
+# thousands of games whose agents spend their time waiting (for a bot on a
+# socket, say) rather than computing.
+
+"""
+A coroutine is a generator that yields Futures and is resumed with their
+results (or has their exception raised at the yield).  It finishes by
+returning, or by raising Return(value) to give its Future a result:
+
+  def think( loop, state ):
+      yield loop.sleep( 0.01 )
+      raise Return( state.getLegalPacmanActions()[0] )
+
+  loop = EventLoop()
+  future = loop.spawn( think( loop, state ) )
+  loop.runUntilComplete( future )
+"""
+
+import heapq, select, sys, types
+from collections import deque
+from util import monotonicTime
+from util import TimeoutFunctionException
+
+class Return(Exception):
+    "Raised by a coroutine to finish with a value."
+    def __init__( self, value=None ):
+        Exception.__init__( self, value )
+        self.value = value
+
+class Future:
+    """
+    A result that will be available later.  Callbacks added with
+    addCallback() run, with the future as argument, once it is done.
+    """
+    def __init__( self ):
+        self.done = False
+        self.result = None
+        self.exception = None
+        self.excInfo = None
+        self.callbacks = []
+
+    def setResult( self, result ):
+        if self.done: return
+        self.done = True
+        self.result = result
+        self._finish()
+
+    def setException( self, exception, excInfo=None ):
+        if self.done: return
+        self.done = True
+        self.exception = exception
+        self.excInfo = excInfo
+        self._finish()
+
+    def addCallback( self, callback ):
+        if self.done: callback( self )
+        else: self.callbacks.append( callback )
+
+    def get( self ):
+        "Returns the result, or raises the exception the future failed with."
+        if self.excInfo != None: raise self.excInfo[0], self.excInfo[1], self.excInfo[2]
+        if self.exception != None: raise self.exception
+        return self.result
+
+    def _finish( self ):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback( self )
+
+class EventLoop:
+    """
+    Runs callbacks, timers and coroutines in one thread.  Readers and
+    writers are waited on with poll() where the platform has it, so the
+    number of sockets is not limited by select().
+    """
+    def __init__( self ):
+        self.ready = deque()
+        self.timers = []
+        self.serial = 0
+        self.readers = {}
+        self.writers = {}
+        self.poller = None
+        if hasattr( select, 'poll' ): self.poller = select.poll()
+
+    def callSoon( self, callback, *args ):
+        self.ready.append( (callback, args) )
+
+    def callLater( self, seconds, callback, *args ):
+        """
+        Runs callback after seconds; returns a handle for cancel().
+        """
+        self.serial += 1
+        timer = [monotonicTime() + seconds, self.serial, callback, args, False]
+        heapq.heappush( self.timers, timer )
+        return timer
+
+    def cancel( self, timer ):
+        timer[4] = True
+
+    def addReader( self, fileno, callback ):
+        "Calls callback() whenever fileno is readable, until removeReader()."
+        if hasattr( fileno, 'fileno' ): fileno = fileno.fileno()
+        self.readers[fileno] = callback
+        self._poll( fileno )
+
+    def removeReader( self, fileno ):
+        if hasattr( fileno, 'fileno' ): fileno = fileno.fileno()
+        if fileno not in self.readers: return
+        del self.readers[fileno]
+        self._poll( fileno )
+
+    def addWriter( self, fileno, callback ):
+        "Calls callback() whenever fileno is writable, until removeWriter()."
+        if hasattr( fileno, 'fileno' ): fileno = fileno.fileno()
+        self.writers[fileno] = callback
+        self._poll( fileno )
+
+    def removeWriter( self, fileno ):
+        if hasattr( fileno, 'fileno' ): fileno = fileno.fileno()
+        if fileno not in self.writers: return
+        del self.writers[fileno]
+        self._poll( fileno )
+
+    def _poll( self, fileno ):
+        "Registers fileno with the poller for the events it is waited on for."
+        if self.poller == None: return
+        events = 0
+        if fileno in self.readers: events |= select.POLLIN
+        if fileno in self.writers: events |= select.POLLOUT
+        if events: self.poller.register( fileno, events )
+        else: self.poller.unregister( fileno )
+
+    def sleep( self, seconds ):
+        future = Future()
+        self.callLater( seconds, future.setResult, None )
+        return future
+
+    def future( self, value ):
+        """
+        Turns what an async method returned into a Future: Futures are
+        returned as they are, generators are spawned, and anything else is
+        taken as an immediate result.
+        """
+        if isinstance( value, Future ): return value
+        if isinstance( value, types.GeneratorType ): return self.spawn( value )
+        future = Future()
+        future.setResult( value )
+        return future
+
+    def waitFor( self, future, seconds ):
+        """
+        Returns a Future for future's outcome that fails with a
+        TimeoutFunctionException if it takes longer than seconds.
+        """
+        outcome = Future()
+        def expire():
+            outcome.setException( TimeoutFunctionException() )
+        timer = self.callLater( seconds, expire )
+        def finish( future ):
+            self.cancel( timer )
+            if future.exception != None: outcome.setException( future.exception, future.excInfo )
+            else: outcome.setResult( future.result )
+        future.addCallback( finish )
+        return outcome
+
+    def spawn( self, coroutine ):
+        "Starts a coroutine and returns the Future of its result."
+        task = Future()
+        self.callSoon( self._step, coroutine, task, None, None )
+        return task
+
+    def _step( self, coroutine, task, value, excInfo ):
+        try:
+            if excInfo != None:
+                yielded = coroutine.throw( *excInfo )
+            else:
+                yielded = coroutine.send( value )
+        except StopIteration:
+            task.setResult( None )
+            return
+        except Return, r:
+            task.setResult( r.value )
+            return
+        except Exception, e:
+            task.setException( e, sys.exc_info() )
+            return
+        future = self.future( yielded )
+        def resume( future ):
+            if future.exception != None:
+                excInfo = future.excInfo
+                if excInfo == None: excInfo = (type(future.exception), future.exception, None)
+                self.callSoon( self._step, coroutine, task, None, excInfo )
+            else:
+                self.callSoon( self._step, coroutine, task, future.result, None )
+        future.addCallback( resume )
+
+    def runReady( self ):
+        while len( self.ready ) > 0:
+            callback, args = self.ready.popleft()
+            callback( *args )
+
+    def runOnce( self ):
+        """
+        Runs the callbacks that are ready, then waits for the next timer,
+        reader or writer and runs what it triggers.  Timers run in deadline order, each
+        followed by the callbacks it made ready, so a result that arrived in
+        time is not beaten by a later timeout on a busy loop.
+        """
+        self.runReady()
+        timeout = None
+        while len( self.timers ) > 0 and self.timers[0][4]:
+            heapq.heappop( self.timers )
+        if len( self.timers ) > 0:
+            timeout = max( 0.0, self.timers[0][0] - monotonicTime() )
+        if len( self.readers ) > 0 or len( self.writers ) > 0:
+            if self.poller != None:
+                if timeout != None: timeout = timeout * 1000
+                events = self.poller.poll( timeout )
+                # Errors and hang ups go to both, which see them on recv or send
+                readable = [fileno for fileno, event in events if event & ~select.POLLOUT]
+                writable = [fileno for fileno, event in events if event & (select.POLLOUT | select.POLLERR | select.POLLHUP)]
+            else:
+                readable, writable = select.select( self.readers.keys(), self.writers.keys(), [], timeout )[:2]
+            for fileno in readable:
+                if fileno in self.readers: self.readers[fileno]()
+            for fileno in writable:
+                if fileno in self.writers: self.writers[fileno]()
+            self.runReady()
+        elif timeout != None:
+            import time
+            time.sleep( timeout )
+        now = monotonicTime()
+        while len( self.timers ) > 0 and self.timers[0][0] <= now:
+            timer = heapq.heappop( self.timers )
+            if not timer[4]:
+                timer[2]( *timer[3] )
+                self.runReady()
+
+    def runUntilComplete( self, future ):
+        "Runs the loop until future is done and returns its result."
+        while not future.done:
+            if len( self.ready ) == 0 and len( self.timers ) == 0 and len( self.readers ) == 0 and len( self.writers ) == 0:
+                raise Exception( 'The event loop has nothing left to run' )
+            self.runOnce()
+        return future.get()
+
+def gather( futures ):
+    "Returns a Future for the list of results of futures."
+    outcome = Future()
+    results = [None for future in futures]
+    pending = [len( futures )]
+    if len( futures ) == 0: outcome.setResult( results )
+    def collect( i ):
+        def done( future ):
+            results[i] = future.result
+            pending[0] -= 1
+            if pending[0] == 0: outcome.setResult( results )
+        return done
+    for i, future in enumerate( futures ):
+        future.addCallback( collect( i ) )
+    return outcome
@@ -44,6 +44,10 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
+from game import BitGrid
+from game import AgentState
+from game import COUNTERS
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
@@ -92,27 +96,41 @@ class GameState:
 
         # Copy current state
         state = GameState(self)
+        state._applyMove( agentIndex, action )
+        return state
+
+    def _applyMove( self, agentIndex, action ):
+        """
+        Applies one agent's move to this state in place.  Used on fresh copies
+        by generateSuccessor and generatePacmanSuccessor.
+        """
+        data = self.data
+        data._foodEaten = None
+        data._foodAdded = None
+        data._capsuleEaten = None
+        data.scoreChange = 0
 
         # Let agent's logic deal with its action's effects on the board
+        data.toggleAgentKey( agentIndex )
         if agentIndex == 0:  # Pacman is moving
-            state.data._eaten = [False for i in range(state.getNumAgents())]
-            PacmanRules.applyAction( state, action )
+            data._eaten = [False for i in range(self.getNumAgents())]
+            PacmanRules.applyAction( self, action )
         else:                # A ghost is moving
-            GhostRules.applyAction( state, action, agentIndex )
+            GhostRules.applyAction( self, action, agentIndex )
 
         # Time passes
         if agentIndex == 0:
-            state.data.scoreChange += -TIME_PENALTY # Penalty for waiting around
+            data.scoreChange += -TIME_PENALTY # Penalty for waiting around
         else:
-            GhostRules.decrementTimer( state.data.agentStates[agentIndex] )
+            GhostRules.decrementTimer( data.writableAgentState( agentIndex ) )
+        data.toggleAgentKey( agentIndex )
 
         # Resolve multi-agent effects
-        GhostRules.checkDeath( state, agentIndex )
+        GhostRules.checkDeath( self, agentIndex )
 
         # Book keeping
-        state.data._agentMoved = agentIndex
-        state.data.score += state.data.scoreChange
-        return state
+        data._agentMoved = agentIndex
+        data.score += data.scoreChange
 
     def getLegalPacmanActions( self ):
         actions = self.getLegalActions( 0 )
@@ -131,22 +149,65 @@ class GameState:
     def generatePacmanSuccessor( self, action ):
         if not self.checkLegalAction(action):
             action = Directions.STOP;
-        Game.currentIterations -= 1
-        if Game.currentIterations <= 0:
+        if self.budget != None and not self.budget.charge():
             return None
         """
-        Generates the successor state after the specified pacman move
+        Generates the successor state after the specified pacman move and one
+        random legal move per ghost.  The state is copied once and every move
+        is applied to that copy in place.
+        """
+        if self.isWin() or self.isLose(): raise Exception('Can\'t generate a successor of a terminal state.')
+        newState = GameState(self)
+        newState._applyPacmanTurn( action )
+        return newState
+
+    def _applyPacmanTurn( self, action ):
         """
-        newState = self.generateSuccessor(0, action)
+        Applies the pacman move and then one random legal move per ghost to
+        this state in place.
+        """
+        self._applyMove( 0, action )
+        data = self.data
         for i in range(1,self.getNumAgents()):
-            actions = newState.getLegalActions(i)
-            if newState.isWin() or newState.isLose():
+            if data._win or data._lose:
                 break;
+            actions = GhostRules.getLegalActions( self, i )
             if len(actions) > 0:
-                newState = newState.generateSuccessor(i, actions[random.randint(0, len(actions) - 1)])
+                self._applyMove( i, actions[random.randint(0, len(actions) - 1)] )
             else:
-                newState = newState.generateSuccessor(i, Directions.STOP)
-        return newState
+                self._applyMove( i, Directions.STOP )
+
+    def apply( self, action ):
+        """
+        Make/unmake search: advances this state in place exactly as
+        generatePacmanSuccessor would, and returns a record that undo() uses
+        to restore the state as it was.  Each call counts against the
+        forward model budget; None is returned once it is used up.
+
+        Agents can walk a search tree with a single state:
+
+          record = state.apply(action)
+          ... look at state ...
+          state.undo(record)
+
+        Records must be undone in reverse order of the apply() calls.
+        """
+        if self.data.frozen: raise Exception('Can\'t apply an action to a read-only observation.')
+        if not self.checkLegalAction(action):
+            action = Directions.STOP;
+        if self.budget != None and not self.budget.charge():
+            return None
+        if self.isWin() or self.isLose(): raise Exception('Can\'t apply an action to a terminal state.')
+        record = self.data.saveStep()
+        self._applyPacmanTurn( action )
+        return record
+
+    def undo( self, record ):
+        """
+        Restores the state saved by the apply() call that returned record.
+        """
+        if self.data.frozen: raise Exception('Can\'t undo on a read-only observation.')
+        self.data.restoreStep( record )
 
     def getPacmanState( self ):
         """
@@ -189,7 +250,12 @@ class GameState:
         return self.data.capsules
 
     def getNumFood( self ):
-        return self.data.food.count()
+        """
+        Returns the number of food pellets left, kept up to date by the rules.
+        """
+        if DEBUG_FOOD_COUNT and self.data.numFood != self.data.food.count():
+            raise Exception("Cached food count %d does not match the grid (%d)" % (self.data.numFood, self.data.food.count()))
+        return self.data.numFood
 
     def getFood(self):
         """
@@ -216,7 +282,7 @@ class GameState:
         return self.data.layout.walls
 
     def hasFood(self, x, y):
-        return self.data.food[x][y]
+        return self.data.food.isSet(x, y)
 
     def hasWall(self, x, y):
         return self.data.layout.walls[x][y]
@@ -227,6 +293,89 @@ class GameState:
     def isWin( self ):
         return self.data._win
 
+    def key( self ):
+        """
+        Returns a compact, hashable key for this state: two keys are equal
+        exactly when the states are equal (==).  The key is a tuple of four
+        ints, so millions of them fit in a visited set or transposition table:
+
+          (agents, food, capsules, score)
+
+        agents packs every agent's position (in half cells), heading and
+        scared timer, food is the food bitmask with cell (x,y) at bit
+        x * height + y, and capsules is a bitmask in the same layout.
+        """
+        data = self.data
+        height = data.layout.height
+        cells = 4 * data.layout.width * height
+        timers = SCARED_TIME + 1
+        agents = 0
+        for agentState in data.agentStates:
+            conf = agentState.configuration
+            x, y = conf.pos
+            cell = int(x * 2 + 0.5) * 2 * height + int(y * 2 + 0.5)
+            code = (cell * 5 + _DIRECTION_CODES[conf.direction]) * timers + agentState.scaredTimer
+            agents = agents * cells * 5 * timers + code
+        food = data.food
+        if not isinstance(food, BitGrid):
+            food = BitGrid.fromGrid(food)
+        capsules = 0
+        for x, y in data.capsules:
+            capsules |= 1 << (x * height + y)
+        return (agents, food.bits, capsules, data.score)
+
+    def pack( self ):
+        """
+        Returns this state as a tuple of plain values, a few hundred bytes
+        when pickled, for sending to another process.  The layout is left
+        out: unpack() rebuilds the state on a state with the same layout.
+        """
+        data = self.data
+        food = data.food
+        if not isinstance(food, BitGrid):
+            food = BitGrid.fromGrid(food)
+        agents = tuple([(s.configuration.pos, s.configuration.direction, s.isPacman,
+                         s.scaredTimer, s.numCarrying, s.numReturned) for s in data.agentStates])
+        return (agents, food.bits, tuple(data.capsules), data.score, data.numFood, tuple(data._eaten),
+                data._agentMoved, data._foodEaten, data._foodAdded, data._capsuleEaten,
+                data._win, data._lose, data.scoreChange)
+
+    def unpack( self, packed ):
+        """
+        Returns the state that pack() turned into packed, using this state's
+        layout and agent start positions.
+        """
+        (agents, foodBits, capsules, score, numFood, eaten, agentMoved, foodEaten, foodAdded,
+         capsuleEaten, win, lose, scoreChange) = packed
+        state = GameState( self )
+        data = state.data
+        agentStates = []
+        configurations = Configuration.getTable( data.layout )
+        for i, (pos, direction, isPacman, scaredTimer, numCarrying, numReturned) in enumerate(agents):
+            agentState = AgentState( self.data.agentStates[i].start, isPacman )
+            agentState.configuration = Configuration( pos, direction, configurations )
+            agentState.scaredTimer = scaredTimer
+            agentState.numCarrying = numCarrying
+            agentState.numReturned = numReturned
+            agentStates.append( agentState )
+        data.agentStates = agentStates
+        data._agentsCopied = [True for a in agentStates]
+        data.food = BitGrid( data.layout.width, data.layout.height, bits=foodBits )
+        data.numFood = numFood
+        data.capsules = list(capsules)
+        data._capsulesCopied = True
+        data.score = score
+        data._eaten = list(eaten)
+        data._agentMoved = agentMoved
+        data._foodEaten = foodEaten
+        data._foodAdded = foodAdded
+        data._capsuleEaten = capsuleEaten
+        data._win = win
+        data._lose = lose
+        data.scoreChange = scoreChange
+        data._hashKey = data._zobrist.hashKey( data )
+        return state
+
     #############################################
     #             Helper methods:               #
     # You shouldn't need to call these directly #
@@ -235,17 +384,43 @@ class GameState:
     def __init__( self, prevState = None ):
         """
         Generates a new state by copying information from its predecessor.
+        Successors share their predecessor's SimulationBudget; a state without
+        one (budget None) has unlimited forward model calls.
         """
         if prevState != None: # Initial state
             self.data = GameStateData(prevState.data)
+            self.budget = prevState.budget
         else:
             self.data = GameStateData()
+            self.budget = None
 
     def deepCopy( self ):
         state = GameState( self )
         state.data = self.data.deepCopy()
         return state
 
+    def makeObservation( self, agentIndex ):
+        """
+        Returns a read-only view of this state.  The view shares the food
+        grid (copied on write) and the layout with this state but has its own
+        copies of the few agent states and capsules, so nothing an agent does
+        to it reaches the game; apply() and undo() refuse to run on it.
+        Successors generated from a view are ordinary states.
+        """
+        state = GameState( self )
+        state.data.agentStates = state.data.copyAgentStates( self.data.agentStates )
+        state.data._agentsCopied = [True for a in state.data.agentStates]
+        state.data.capsules = self.data.capsules[:]
+        state.data._capsulesCopied = True
+        state.data._agentMoved = self.data._agentMoved
+        state.data._foodEaten = self.data._foodEaten
+        state.data._foodAdded = self.data._foodAdded
+        state.data._capsuleEaten = self.data._capsuleEaten
+        state.data._win = self.data._win
+        state.data._lose = self.data._lose
+        state.data.frozen = True
+        return state
+
     def __eq__( self, other ):
         """
         Allows two states to be compared.
@@ -268,6 +443,10 @@ class GameState:
         """
         self.data.initialize(layout, numGhostAgents)
 
+COUNTERS.count('generateSuccessor', GameState, 'generateSuccessor')
+COUNTERS.count('generatePacmanSuccessor', GameState, 'generatePacmanSuccessor')
+COUNTERS.count('getLegalActions', GameState, 'getLegalActions')
+
 ############################################################################
 #                     THE HIDDEN SECRETS OF PACMAN                         #
 #                                                                          #
@@ -277,20 +456,37 @@ class GameState:
 SCARED_TIME = 40    # Moves ghosts are scared
 COLLISION_TOLERANCE = 0.7 # How close ghosts must be to Pacman to kill
 TIME_PENALTY = 0 # Number of points lost each round
+_DIRECTION_CODES = {Directions.NORTH: 0, Directions.SOUTH: 1, Directions.EAST: 2,
+                    Directions.WEST: 3, Directions.STOP: 4}
+DEBUG_FOOD_COUNT = False # Cross-check the cached food count against the grid
 
 class ClassicGameRules:
     """
     These game rules manage the control flow of a game, deciding when
     and how the game starts and ends.
     """
-    def __init__(self, timeout=1):
+    def __init__(self, timeout=1, moveTimeout=None, startupTimeout=None, maxIterations=1000, timeLimit=30):
+        """
+        timeout bounds an agent's total computing time over the game;
+        moveTimeout and startupTimeout (seconds, fractions allowed) bound a
+        single move and registerInitialState, and default to timeout.
+        maxIterations and timeLimit are handed to every Game (see Game).
+        """
         self.timeout = timeout
-
-    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False):
+        self.maxIterations = maxIterations
+        self.timeLimit = timeLimit
+        self.moveTimeout = moveTimeout
+        self.startupTimeout = startupTimeout
+        if moveTimeout == None: self.moveTimeout = timeout
+        if startupTimeout == None: self.startupTimeout = timeout
+
+    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False, agentLog=None):
         agents = [pacmanAgent] + ghostAgents[:layout.getNumGhosts()]
         initState = GameState()
         initState.initialize( layout, len(ghostAgents) )
-        game = Game(agents, display, self, catchExceptions=catchExceptions)
+        # With an agentLog file, what the agents print goes there instead of the console
+        game = Game(agents, display, self, muteAgents=agentLog != None, catchExceptions=catchExceptions,
+                    maxIterations=self.maxIterations, timeLimit=self.timeLimit, outputLog=agentLog)
         game.state = initState
         self.initialState = initState.deepCopy()
         self.quiet = quiet
@@ -324,13 +520,13 @@ class ClassicGameRules:
         return self.timeout
 
     def getMaxStartupTime(self, agentIndex):
-        return self.timeout
+        return self.startupTimeout
 
     def getMoveWarningTime(self, agentIndex):
-        return self.timeout
+        return self.moveTimeout
 
     def getMoveTimeout(self, agentIndex):
-        return self.timeout
+        return self.moveTimeout
 
     def getMaxTimeWarnings(self, agentIndex):
         return 0
@@ -346,7 +542,11 @@ class PacmanRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions( state.getPacmanState().configuration, state.data.layout.walls )
+        conf = state.data.agentStates[0].configuration
+        actions = state.data.layout.pacmanActions.get( conf.pos )
+        if actions is None:
+            return Actions.getPossibleActions( conf, state.data.layout.walls )
+        return list( actions )
     getLegalActions = staticmethod( getLegalActions )
 
     def applyAction( state, action ):
@@ -357,7 +557,7 @@ class PacmanRules:
         if action not in legal:
             action = Directions.STOP;
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.writableAgentState( 0 )
 
         # Update Configuration
         vector = Actions.directionToVector( action, PacmanRules.PACMAN_SPEED )
@@ -374,23 +574,27 @@ class PacmanRules:
     def consume( position, state ):
         x,y = position
         # Eat food
-        if state.data.food[x][y]:
+        if state.data.food.isSet(x, y):
             state.data.scoreChange += 10
             state.data.food = state.data.food.copy()
             state.data.food[x][y] = False
+            state.data.toggleFoodKey( position )
             state.data._foodEaten = position
-            # TODO: cache numFood?
+            state.data.numFood -= 1
             numFood = state.getNumFood()
             if numFood == 0 and not state.data._lose:
                 state.data.scoreChange += 500
                 state.data._win = True
         # Eat capsule
         if( position in state.getCapsules() ):
-            state.data.capsules.remove( position )
+            state.data.writableCapsules().remove( position )
+            state.data.toggleCapsuleKey( position )
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range( 1, len( state.data.agentStates ) ):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.toggleAgentKey( index )
+                state.data.writableAgentState( index ).scaredTimer = SCARED_TIME
+                state.data.toggleAgentKey( index )
     consume = staticmethod( consume )
 
 class GhostRules:
@@ -404,6 +608,10 @@ class GhostRules:
         reach a dead end, but can turn 90 degrees at intersections.
         """
         conf = state.getGhostState( ghostIndex ).configuration
+        actions = state.data.layout.ghostActions.get( (conf.pos, conf.direction) )
+        if actions is not None:
+            return list( actions )
+        # Off the grid (a scared ghost moving at half speed)
         possibleActions = Actions.getPossibleActions( conf, state.data.layout.walls )
         reverse = Actions.reverseDirection( conf.direction )
         if Directions.STOP in possibleActions:
@@ -419,7 +627,7 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.writableAgentState( ghostIndex )
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0: speed /= 2.0
         vector = Actions.directionToVector( action, speed )
@@ -429,7 +637,8 @@ class GhostRules:
     def decrementTimer( ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint( ghostState.configuration.pos )
+            conf = ghostState.configuration
+            ghostState.configuration = conf.moveTo( nearestPoint( conf.pos ) )
         ghostState.scaredTimer = max( 0, timer - 1 )
     decrementTimer = staticmethod( decrementTimer )
 
@@ -451,8 +660,11 @@ class GhostRules:
     def collide( state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
             state.data.scoreChange += 200
+            state.data.toggleAgentKey( agentIndex )
+            ghostState = state.data.writableAgentState( agentIndex )
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
+            state.data.toggleAgentKey( agentIndex )
             # Added for first-person
             state.data._eaten[agentIndex] = True
         else:
@@ -536,14 +748,38 @@ def readCommand( argv ):
                       help=default('Time to delay between frames; <0 means keyboard'), default=0.04)
     parser.add_option('-c', '--catchExceptions', action='store_true', dest='catchExceptions',
                       help='Turns on exception handling and timeouts during games', default=False)
-    parser.add_option('--timeout', dest='timeout', type='int',
+    parser.add_option('--timeout', dest='timeout', type='float',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--moveTimeout', dest='moveTimeout', type='float',
+                      help='Maximum seconds (e.g. 0.1) an agent can spend on a single move with -c [Default: --timeout]', default=None)
+    parser.add_option('--startupTimeout', dest='startupTimeout', type='float',
+                      help='Maximum seconds an agent can spend in registerInitialState with -c [Default: --timeout]', default=None)
     parser.add_option('-i', '--iterations', dest='iterations', type='int',
                       help=default('Maximum length of forward model steps'), default=500)
+    parser.add_option('--workers', dest='workers', type='int',
+                      help=default('Number of processes to play games on without graphics (1 plays them in this process)'), default=1)
+    parser.add_option('--isolate', action='store_true', dest='isolate',
+                      help='Run the pacman agent in its own worker process, restarted after a crash or timeout', default=False)
+    parser.add_option('--agentMemory', dest='agentMemory', type='int',
+                      help='Memory limit in MB for the agent process with --isolate', default=None)
+    parser.add_option('--agentLog', dest='agentLog', metavar='DIR',
+                      help='Write what the agents print in each game to DIR/game-N.log instead of the console', default=None)
+    parser.add_option('--countOperations', action='store_true', dest='countOperations',
+                      help='Count the engine calls (successors, copies, hashes, legal actions) each agent makes', default=False)
+    parser.add_option('--trace', dest='trace', metavar='FILE',
+                      help='Time every move and write a Chrome trace of the games to FILE, printing where each game\'s time went', default=None)
+    parser.add_option('--serve', dest='serve', metavar='ADDRESS',
+                      help='Host the games for remote bots (see botClient.py) on host:port or a Unix socket path, instead of playing -p', default=None)
+    parser.add_option('--debugFoodCount', action='store_true', dest='debugFoodCount',
+                      help='Check the cached food count against the food grid on every lookup', default=False)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
         raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.trace and options.workers > 1:
+        raise Exception('--trace times the games in this process: it cannot be used with --workers')
+    if options.agentLog and options.serve:
+        raise Exception('--agentLog logs the agents played here: remote bots print in their own process')
     args = dict()
 
     # Fix the random seed
@@ -554,13 +790,20 @@ def readCommand( argv ):
     if args['layout'] == None: raise Exception("The layout " + options.layout + " cannot be found")
 
     # Choose a Pacman agent
-    noKeyboard = options.gameToReplay == None and (options.textGraphics or options.quietGraphics)
-    pacmanType = loadAgent(options.pacman, noKeyboard)
+    noKeyboard = options.gameToReplay == None and (options.textGraphics or options.quietGraphics or options.serve)
     agentOpts = parseAgentArgs(options.agentArgs)
     if options.numTraining > 0:
         args['numTraining'] = options.numTraining
         if 'numTraining' not in agentOpts: agentOpts['numTraining'] = options.numTraining
-    pacman = pacmanType(**agentOpts) # Instantiate Pacman with agentArgs
+    if options.serve:
+        pacman = None # The bots that connect play pacman
+    elif options.isolate:
+        import agentHost
+        pacmanType = loadAgent(options.pacman, noKeyboard)
+        pacman = agentHost.HostedAgent(agentHost.AgentFactory(pacmanType, agentOpts), maxMemory=options.agentMemory)
+    else:
+        pacmanType = loadAgent(options.pacman, noKeyboard)
+        pacman = pacmanType(**agentOpts) # Instantiate Pacman with agentArgs
     args['pacman'] = pacman
 
     # Don't display training games
@@ -573,7 +816,7 @@ def readCommand( argv ):
     args['ghosts'] = [ghostType( i+1 ) for i in range( options.numGhosts )]
 
     # Choose a display format
-    if options.quietGraphics:
+    if options.quietGraphics or options.serve:
         import textDisplay
         args['display'] = textDisplay.NullGraphics()
     elif options.textGraphics:
@@ -587,10 +830,18 @@ def readCommand( argv ):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['moveTimeout'] = options.moveTimeout
+    args['startupTimeout'] = options.startupTimeout
+    args['workers'] = options.workers
+    args['serve'] = options.serve
+    args['trace'] = options.trace
+    args['countOperations'] = options.countOperations
+    args['agentLog'] = options.agentLog
 
-    Game.maxIterations = options.iterations
-    Game.currentIterations = Game.maxIterations
-    Game.timeLimit = options.timeout
+    args['maxIterations'] = options.iterations
+
+    global DEBUG_FOOD_COUNT
+    DEBUG_FOOD_COUNT = options.debugFoodCount
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
@@ -646,11 +897,89 @@ def replayGame( layout, actions, display ):
 
     display.finish()
 
-def runGames( layout, pacman, ghosts, display, numGames, record=False, numTraining = 0, catchExceptions=False, timeout=30 ):
+class GameResult:
+    """
+    The outcome of one finished game, small enough to send back from a
+    worker process: score, win, number of pacman moves and agent times.
+    """
+    def __init__( self, game, keepHistory=False ):
+        self.score = game.state.getScore()
+        self.win = game.state.isWin()
+        self.lose = game.state.isLose()
+        self.numMoves = len([agentIndex for agentIndex, action in game.moveHistory if agentIndex == 0])
+        self.agentTimes = game.totalAgentTimes[:]
+        self.operationCounts = game.operationCounts
+        self.countedMoves = game.countedMoves
+        self.moveHistory = None
+        if keepHistory: self.moveHistory = game.moveHistory
+
+def printOperationCounts( games ):
+    """
+    Prints, for each agent, the engine calls its getAction made per move
+    and per game, over games (Games or GameResults played with COUNTERS
+    enabled).
+    """
+    counted = [game for game in games if game.operationCounts != None]
+    if len(counted) == 0: return
+    for agentIndex in range( max([len(game.operationCounts) for game in counted]) ):
+        totals = {}
+        moves = 0
+        for game in counted:
+            if agentIndex >= len(game.operationCounts): continue
+            for name, calls in game.operationCounts[agentIndex].items():
+                totals[name] = totals.get(name, 0) + calls
+            moves += game.countedMoves[agentIndex]
+        if moves == 0: continue
+        if agentIndex == 0: print 'Pacman engine calls (%d moves):' % moves
+        else: print 'Ghost %d engine calls (%d moves):' % (agentIndex, moves)
+        for name in sorted(totals):
+            print '  %-24s %12.1f per move %12.1f per game' % (name, totals[name] / float(moves),
+                                                               totals[name] / float(len(counted)))
+
+def recordGame( layout, moveHistory, i ):
+    import time, cPickle
+    fname = ('recorded-game-%d' % (i + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
+    f = file(fname, 'w')
+    components = {'layout': layout, 'actions': moveHistory}
+    cPickle.dump(components, f)
+    f.close()
+
+def printSummary( scores, wins ):
+    winRate = wins.count(True)/ float(len(wins))
+    print 'Average Score:', sum(scores) / float(len(scores))
+    print 'Scores:       ', ', '.join([str(score) for score in scores])
+    print 'Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), winRate)
+    print 'Record:       ', ', '.join([ ['Loss', 'Win'][int(w)] for w in wins])
+
+def runGames( layout, pacman, ghosts, display, numGames, record=False, numTraining = 0, catchExceptions=False, timeout=30, workers=1,
+              moveTimeout=None, startupTimeout=None, maxIterations=1000, serve=None, trace=None,
+              countOperations=False, agentLog=None ):
     import __main__
     __main__.__dict__['_display'] = display
 
-    rules = ClassicGameRules(timeout)
+    tracer = None
+    if trace != None:
+        import tracer as tracing
+        tracer = tracing.Tracer()
+
+    if serve != None:
+        import gameServer
+        games = gameServer.serveGames( serve, layout, ghosts, numGames,
+                                       (timeout, moveTimeout, startupTimeout, maxIterations, timeout), tracer=tracer )
+        if tracer != None:
+            tracer.write( trace )
+            print 'Wrote a trace of %d games to %s' % (len(tracer.traces), trace)
+        return games
+
+    if agentLog != None and not os.path.isdir( agentLog ): os.makedirs( agentLog )
+
+    if workers > 1:
+        return runGamesInParallel( layout, pacman, ghosts, numGames, workers, record, numTraining, catchExceptions, timeout,
+                                   moveTimeout, startupTimeout, maxIterations, countOperations, agentLog )
+
+    if countOperations: COUNTERS.enable()
+
+    rules = ClassicGameRules(timeout, moveTimeout, startupTimeout, maxIterations, timeout)
     games = []
 
     for i in range( numGames ):
@@ -663,29 +992,90 @@ def runGames( layout, pacman, ghosts, display, numGames, record=False, numTraini
         else:
             gameDisplay = display
             rules.quiet = False
-        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions)
+        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions, agentLogPath( agentLog, i ) )
+        game.tracer = tracer
         game.run()
         if not beQuiet: games.append(game)
+        if tracer != None and not beQuiet: game.trace.printSummary()
 
         if record:
-            import time, cPickle
-            fname = ('recorded-game-%d' % (i + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = file(fname, 'w')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            cPickle.dump(components, f)
-            f.close()
+            recordGame( layout, game.moveHistory, i )
 
     if (numGames-numTraining) > 0:
         scores = [game.state.getScore() for game in games]
         wins = [game.state.isWin() for game in games]
-        winRate = wins.count(True)/ float(len(wins))
-        print 'Average Score:', sum(scores) / float(len(scores))
-        print 'Scores:       ', ', '.join([str(score) for score in scores])
-        print 'Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), winRate)
-        print 'Record:       ', ', '.join([ ['Loss', 'Win'][int(w)] for w in wins])
+        printSummary( scores, wins )
+        if countOperations: printOperationCounts( games )
+    if countOperations: COUNTERS.disable()
+
+    if tracer != None:
+        tracer.write( trace )
+        print 'Wrote a trace of %d games to %s' % (len(tracer.traces), trace)
 
     return games
 
+def agentLogPath( directory, gameNumber ):
+    "The --agentLog file of a game, or None without --agentLog."
+    if directory == None: return None
+    return os.path.join( directory, 'game-%d.log' % gameNumber )
+
+_WORKER_GAME = None
+
+def _initWorker( layout, pacman, ghosts, catchExceptions, rulesArgs, countOperations=False ):
+    """
+    Runs once in each worker process: keeps the preloaded layout and agents
+    for every game the worker plays.
+    """
+    global _WORKER_GAME
+    _WORKER_GAME = (layout, pacman, ghosts, catchExceptions, rulesArgs)
+    if countOperations: COUNTERS.enable()
+
+def _runGameInWorker( job ):
+    seed, keepHistory, agentLog = job
+    layout, pacman, ghosts, catchExceptions, rulesArgs = _WORKER_GAME
+    import textDisplay
+    random.seed( seed )
+    rules = ClassicGameRules( *rulesArgs )
+    game = rules.newGame( layout, pacman, ghosts, textDisplay.NullGraphics(), True, catchExceptions, agentLog )
+    game.run()
+    return GameResult( game, keepHistory )
+
+def runGamesInParallel( layout, pacman, ghosts, numGames, workers, record=False, numTraining = 0, catchExceptions=False, timeout=30,
+                        moveTimeout=None, startupTimeout=None, maxIterations=1000, countOperations=False, agentLog=None ):
+    """
+    Plays numGames headless games on a pool of worker processes.  Each game
+    gets its own seed drawn from the main random stream, so -f still makes a
+    batch repeatable, and only a GameResult per game comes back.  Learning
+    agents do not carry training over between processes.
+    """
+    import multiprocessing
+    seeds = [random.randint(0, sys.maxint) for i in range( numGames )]
+    jobs = [(seed, record, agentLogPath( agentLog, i )) for i, seed in enumerate( seeds )]
+    pool = multiprocessing.Pool( workers, _initWorker,
+                                 (layout, pacman, ghosts, catchExceptions,
+                                  (timeout, moveTimeout, startupTimeout, maxIterations, timeout), countOperations) )
+    results = []
+    try:
+        for i, result in enumerate( pool.imap( _runGameInWorker, jobs ) ):
+            if i >= numTraining:
+                if result.win: print "Pacman emerges victorious! Score: %d" % result.score
+                if result.lose: print "Pacman died! Score: %d" % result.score
+                results.append( result )
+            if record:
+                recordGame( layout, result.moveHistory, i )
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    if len( results ) > 0:
+        printSummary( [result.score for result in results], [result.win for result in results] )
+        if countOperations: printOperationCounts( results )
+
+    return results
+
 if __name__ == '__main__':
     """
     The main function called when pacman.py is run
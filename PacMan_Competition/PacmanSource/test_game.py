@@ -0,0 +1,249 @@
+# test_game.py
+# ------------
+# Regression tests for game.py: its data structures and the Game loop.
+#
+# Run with:  python -m unittest discover -p 'test_*.py'
+
+import unittest, random, sys, time, threading
+from game import Agent, Directions, Grid, BitGrid, SimulationBudget, OperationCounters, COUNTERS
+from test_gameState import MEDIUM_CLASSIC, WanderingAgent, newGame, initialState
+from eventLoop import EventLoop, Return
+import layout, pacman, textDisplay, ghostAgents
+
+class BitGridTest( unittest.TestCase ):
+
+    def assertSameCells( self, bits, grid ):
+        self.assertEqual( [[bits[x][y] for y in range( bits.height )] for x in range( bits.width )], grid.data )
+        self.assertEqual( [[bits.isSet( x, y ) for y in range( bits.height )] for x in range( bits.width )], grid.data )
+        self.assertEqual( bits.count(), grid.count() )
+        self.assertEqual( bits.count( False ), grid.count( False ) )
+        self.assertEqual( sorted( bits.asList() ), sorted( grid.asList() ) )
+        self.assertEqual( sorted( bits.asList( False ) ), sorted( grid.asList( False ) ) )
+        self.assertEqual( str( bits ), str( grid ) )
+        self.assertTrue( bits == grid )
+        self.assertEqual( hash( bits ), hash( grid ) )
+
+    def testMatchesGridUnderRandomWrites( self ):
+        random.seed( 0 )
+        for width, height in [(1, 1), (7, 3), (20, 11), (40, 40)]:
+            grid = Grid( width, height )
+            bits = BitGrid( width, height )
+            for i in range( 300 ):
+                x, y = random.randrange( width ), random.randrange( height )
+                value = random.random() < 0.6
+                grid[x][y] = value
+                bits[x][y] = value
+            self.assertSameCells( bits, grid )
+            self.assertSameCells( BitGrid.fromGrid( grid ), grid )
+            self.assertEqual( bits.toGrid().data, grid.data )
+
+    def testInitialValue( self ):
+        self.assertEqual( BitGrid( 5, 4, True ).count(), 20 )
+        self.assertEqual( BitGrid( 5, 4 ).asList(), [] )
+
+    def testCopiesAreIndependent( self ):
+        bits = BitGrid( 4, 4 )
+        bits[1][2] = True
+        for copy in [bits.copy(), bits.deepCopy(), bits.shallowCopy()]:
+            copy[1][2] = False
+            copy[3][3] = True
+            self.assertTrue( bits[1][2] )
+            self.assertFalse( bits[3][3] )
+            self.assertFalse( copy == bits )
+
+    def testIndexing( self ):
+        bits = BitGrid( 3, 2 )
+        bits[-1][-1] = True
+        self.assertTrue( bits[2][1] )
+        self.assertRaises( IndexError, lambda: bits[3] )
+        self.assertRaises( IndexError, lambda: bits[0][2] )
+
+class SimulationBudgetTest( unittest.TestCase ):
+
+    def testSubBudgetsDrawOnTheirParent( self ):
+        parent = SimulationBudget( 10 ) # Allows 9 calls
+        first, second = parent.subBudget( 5 ), parent.subBudget( 8 )
+        self.assertEqual( [first.charge() for i in range( 5 )], [True] * 4 + [False] )
+        self.assertEqual( first.report(), (4, 5, 5) )
+        self.assertEqual( parent.remaining(), 5 )
+        self.assertEqual( second.remaining(), 5 )
+        self.assertEqual( [second.charge() for i in range( 7 )], [True] * 5 + [False] * 2 )
+        self.assertEqual( second.report(), (5, 7, 8) )
+        self.assertEqual( parent.report(), (9, 11, 10) ) # Both refused calls reached the parent
+        self.assertEqual( second.remaining(), 0 )
+
+    def testAddChargesTheParentToo( self ):
+        parent = SimulationBudget( 100 )
+        child = parent.subBudget( 50 )
+        child.add( 7, 6 )
+        self.assertEqual( child.report(), (6, 7, 50) )
+        self.assertEqual( parent.report(), (6, 7, 100) )
+        self.assertEqual( child.remaining(), 42 )
+
+    def charge( self, budgets, calls ):
+        "Charges each budget calls times, all on threads of their own at once."
+        granted = [0] * len( budgets )
+        def work( i ):
+            for call in range( calls ):
+                if budgets[i].charge(): granted[i] += 1
+        interval = sys.getcheckinterval()
+        sys.setcheckinterval( 1 ) # Switch threads as often as possible
+        try:
+            threads = [threading.Thread( target=work, args=(i,) ) for i in range( len( budgets ) )]
+            for thread in threads: thread.start()
+            for thread in threads: thread.join()
+        finally:
+            sys.setcheckinterval( interval )
+        return granted
+
+    def testThreadsShareOneBudget( self ):
+        budget = SimulationBudget( 20001 )
+        granted = self.charge( [budget] * 8, 5000 )
+        self.assertEqual( sum( granted ), 20000 )
+        self.assertEqual( budget.report(), (20000, 40000, 20001) )
+
+    def testThreadsWithSubBudgets( self ):
+        parent = SimulationBudget( 20001 )
+        granted = self.charge( [parent.subBudget( 3001 ) for i in range( 8 )], 5000 )
+        self.assertEqual( sum( granted ), 20000 )
+        self.assertTrue( max( granted ) <= 3000 )
+        self.assertEqual( parent.report(), (20000, 24000, 20001) )
+
+class Counted:
+    def step( self ):
+        return 'stepped'
+
+    def look( self, *args, **keyArgs ):
+        return (args, keyArgs)
+
+class OperationCountersTest( unittest.TestCase ):
+
+    def testEnableAndDisableRestoreTheOriginals( self ):
+        originals = [(cls, method, cls.__dict__[method]) for name, cls, method in COUNTERS.methods]
+        self.assertTrue( len( originals ) > 0 )
+        wasEnabled = COUNTERS.enabled()
+        COUNTERS.disable()
+        try:
+            COUNTERS.enable()
+            COUNTERS.enable() # Enabling twice wraps once
+            for cls, method, original in originals:
+                self.assertFalse( cls.__dict__[method] is original, (cls, method) )
+                self.assertEqual( cls.__dict__[method].__name__, original.__name__ )
+            self.assertEqual( len( COUNTERS.originals ), len( originals ) )
+            COUNTERS.disable()
+            COUNTERS.disable()
+            for cls, method, original in originals:
+                self.assertTrue( cls.__dict__[method] is original, (cls, method) )
+        finally:
+            if wasEnabled: COUNTERS.enable()
+
+    def testSnapshotsCountTheCallingThreadsCalls( self ):
+        counters = OperationCounters()
+        counters.count( 'step', Counted, 'step' )
+        counters.count( 'look', Counted, 'look' )
+        counted = Counted()
+        counted.step()
+        self.assertEqual( counters.snapshot(), {} )
+        counters.enable()
+        try:
+            self.assertEqual( counted.step(), 'stepped' )
+            self.assertEqual( counted.look( 1, x=2 ), ((1,), {'x': 2}) )
+            before = counters.snapshot()
+            self.assertEqual( before, {'step': 1, 'look': 1} )
+            for i in range( 3 ): counted.step()
+            self.assertEqual( counters.since( before ), {'step': 3} )
+            others = []
+            def work():
+                counted.look()
+                others.append( counters.snapshot() )
+            thread = threading.Thread( target=work )
+            thread.start()
+            thread.join()
+            self.assertEqual( others, [{'look': 1}] )
+            self.assertEqual( counters.snapshot(), {'step': 4, 'look': 1} )
+        finally:
+            counters.disable()
+        counted.step()
+        self.assertEqual( counters.snapshot(), {'step': 4, 'look': 1} )
+
+    def testEngineCalls( self ):
+        state = initialState()
+        wasEnabled = COUNTERS.enabled()
+        COUNTERS.enable()
+        try:
+            before = COUNTERS.snapshot()
+            state.getLegalActions( 0 )
+            state.getLegalActions( 1 )
+            hash( state.getFood() )
+            self.assertEqual( COUNTERS.since( before ), {'getLegalActions': 2, 'Grid.__hash__': 1} )
+            before = COUNTERS.snapshot()
+            state.generatePacmanSuccessor( Directions.WEST )
+            operations = COUNTERS.since( before )
+        finally:
+            if not wasEnabled: COUNTERS.disable()
+        # One copy of the state, which the whole turn is then applied to in place
+        self.assertEqual( operations['generatePacmanSuccessor'], 1 )
+        self.assertEqual( operations['GameStateData'], 1 )
+        self.assertEqual( operations['getLegalActions'], 1 )
+        self.assertFalse( 'generateSuccessor' in operations )
+
+class ThinkingAgent( Agent ):
+    "Reports its actions in turn, then thinks until it is stopped."
+    def __init__( self, reports ):
+        Agent.__init__( self )
+        self.reports = reports
+
+    def getActionAnytime( self, state, budget ):
+        for action in self.reports: budget.report( action )
+        while True: time.sleep( 0.001 )
+
+class MoveDeadlineTest( unittest.TestCase ):
+
+    def solicit( self, agent ):
+        board = layout.Layout( MEDIUM_CLASSIC )
+        ghosts = [ghostAgents.RandomGhost( i+1 ) for i in range( board.getNumGhosts() )]
+        rules = pacman.ClassicGameRules( moveTimeout=0.1 )
+        game = rules.newGame( board, agent, ghosts, textDisplay.NullGraphics(), True, catchExceptions=True )
+        simulations = SimulationBudget( 100 )
+        return game, game._solicitAction( 0, game.observe( 0, simulations ), simulations )
+
+    def testDeadlinePlaysTheLastReportedAction( self ):
+        game, action = self.solicit( ThinkingAgent( [Directions.EAST, Directions.WEST] ) )
+        self.assertEqual( action, Directions.WEST )
+        self.assertFalse( game.agentCrashed )
+        self.assertFalse( game.agentTimeout )
+
+    def testDeadlineWithoutAReportTimesOut( self ):
+        game, action = self.solicit( ThinkingAgent( [] ) )
+        self.assertEqual( action, None )
+        self.assertTrue( game.agentCrashed )
+        self.assertTrue( game.agentTimeout )
+
+class AsyncWanderingAgent( WanderingAgent ):
+    "Waits a turn of the event loop before each move."
+    def __init__( self, loop ):
+        WanderingAgent.__init__( self )
+        self.loop = loop
+
+    def getActionAsync( self, state ):
+        yield self.loop.sleep( 0 )
+        raise Return( self.getAction( state ) )
+
+class RunAsyncTest( unittest.TestCase ):
+
+    def play( self, seed, makeAgent, onLoop ):
+        random.seed( seed )
+        loop = EventLoop()
+        game = newGame( makeAgent( loop ) )
+        if onLoop: loop.runUntilComplete( loop.spawn( game.runAsync( loop ) ) )
+        else: game.run()
+        return game.state.getScore(), game.state.isWin(), game.agentCrashed, game.moveHistory
+
+    def testRunAsyncPlaysLikeRun( self ):
+        for seed in range( 5 ):
+            expected = self.play( seed, lambda loop: WanderingAgent(), False )
+            self.assertEqual( self.play( seed, lambda loop: WanderingAgent(), True ), expected, seed )
+            self.assertEqual( self.play( seed, AsyncWanderingAgent, True ), expected, seed )
+
+if __name__ == '__main__':
+    unittest.main()
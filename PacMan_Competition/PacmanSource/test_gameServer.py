@@ -0,0 +1,82 @@
+# test_gameServer.py
+# ------------------
+# Regression tests for the bot protocol of gameServer.py.
+#
+# Run with:  python -m unittest discover -p 'test_*.py'
+
+import unittest, socket, json
+import gameServer
+from gameServer import BotConnection, BotDisconnected, stateDelta, applyDelta
+from eventLoop import EventLoop
+from test_gameState import initialState, randomPlay
+
+class DeltaTest( unittest.TestCase ):
+
+    def testDeltasRebuildEveryState( self ):
+        for seed in range( 5 ):
+            start = initialState()
+            height = start.data.layout.height
+            packed = start.pack()
+            for state in randomPlay( start, 200, seed ):
+                # The delta goes over the wire as JSON, tuples turning into lists
+                delta = json.loads( json.dumps( stateDelta( packed, state.pack(), height ) ) )
+                packed = applyDelta( packed, delta, height )
+                rebuilt = start.unpack( packed )
+                self.assertEqual( rebuilt.key(), state.key(), seed )
+                self.assertEqual( str( rebuilt ), str( state ) )
+                self.assertEqual( (rebuilt.isWin(), rebuilt.isLose()), (state.isWin(), state.isLose()) )
+
+class BotConnectionTest( unittest.TestCase ):
+
+    def setUp( self ):
+        self.loop = EventLoop()
+        self.server, self.bot = socket.socketpair()
+        self.bot.setblocking( False )
+        self.connection = BotConnection( self.loop, self.server, 'test' )
+
+    def tearDown( self ):
+        self.connection.close()
+        self.bot.close()
+
+    def receive( self ):
+        "Everything the bot can read now."
+        received = ''
+        while True:
+            try:
+                data = self.bot.recv( 65536 )
+            except socket.error:
+                return received
+            if data == '': return received
+            received += data
+
+    def testSendsDoNotWaitForTheBot( self ):
+        # Far more than the socket buffers hold, so most of it has to wait
+        message = {'type': 'start', 'layout': ['%' * 1000] * 1000}
+        self.connection.send( message )
+        self.connection.send( {'type': 'end'} )
+        self.assertTrue( len( self.connection.outgoing ) > 0 )
+        received = ''
+        for i in range( 1000 ):
+            received += self.receive()
+            if received.count( '\n' ) == 2: break
+            self.loop.runOnce()
+        self.assertEqual( [json.loads( line ) for line in received.splitlines()], [message, {'type': 'end'}] )
+        self.assertEqual( self.connection.outgoing, '' )
+        self.assertEqual( self.loop.writers, {} )
+        self.assertFalse( self.connection.closed )
+
+    def testBotThatStopsReadingIsDropped( self ):
+        sendTimeout = gameServer.SEND_TIMEOUT
+        gameServer.SEND_TIMEOUT = 0.05
+        try:
+            answer = self.connection.ask( {'type': 'start', 'layout': ['%' * 1000] * 1000} )
+            self.loop.runUntilComplete( answer )
+        except BotDisconnected:
+            pass
+        finally:
+            gameServer.SEND_TIMEOUT = sendTimeout
+        self.assertTrue( self.connection.closed )
+        self.assertEqual( (self.loop.readers, self.loop.writers), ({}, {}) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+# tournament.py
+# -------------
+# Round-robin tournament harness for the Pacman competition.
+#
+# Every (agent, layout, ghost type, seed) combination is played as one
+# headless game on a pool of worker processes.  Each finished game is
+# appended to a log file as soon as it arrives, so an interrupted tournament
+# can be resumed by running the same command again.  At the end the log is
+# summarised into one row per agent x layout.
+
+"""
+USAGE:      python tournament.py <options>
+EXAMPLES:   (1) python tournament.py
+                - plays CompetitionAgent on every layout in layouts/
+            (2) python tournament.py -l smallClassic -c --moveTimeout 1 --isolate
+                - plays smallClassic with a 1 second move deadline, each agent
+                  in its own process
+            (3) python tournament.py -p CompetitionAgent -l mediumClassic,smallClassic
+                                     -g RandomGhost,DirectionalGhost -s 20 --workers 32
+                - 2 layouts x 2 ghost types x 20 seeds on 32 processes
+"""
+
+from game import Agent
+from util import monotonicTime
+from harness import addLatency, muteWorker, loadLayout, listLayouts, playGames, printProgress, summarizeGames, printTable
+import pacman, textDisplay, agentHost
+import sys, os, time, random, json
+
+class MeasuredAgent( Agent ):
+    """
+    Wraps a pacman agent to time every move and count the forward model
+    calls it makes on the move's SimulationBudget.  Move latencies go into a
+    log-bucketed histogram so results stay small however long the game is.
+    An anytime agent (see game.Agent) keeps its getActionAnytime, and a move
+    cut off by the deadline is still timed.
+    """
+    def __init__( self, agent ):
+        self.agent = agent
+        self.index = getattr(agent, 'index', 0)
+        self.mutableObservation = getattr(agent, 'mutableObservation', False)
+        if hasattr( agent, 'getActionAnytime' ):
+            self.getActionAnytime = self._getActionAnytime
+        self.latencies = {}
+        self.numMoves = 0
+        self.forwardCalls = 0
+
+    def registerInitialState( self, state ):
+        if 'registerInitialState' in dir( self.agent ):
+            self.agent.registerInitialState( state )
+
+    def getAction( self, state ):
+        return self.measure( state, self.agent.getAction, state )
+
+    def _getActionAnytime( self, state, budget ):
+        return self.measure( state, self.agent.getActionAnytime, state, budget )
+
+    def measure( self, state, getAction, *args ):
+        before = state.budget.granted
+        start = monotonicTime()
+        try:
+            return getAction( *args )
+        finally:
+            elapsed = monotonicTime() - start
+            self.forwardCalls += state.budget.granted - before
+            self.numMoves += 1
+            addLatency( self.latencies, elapsed )
+
+    def final( self, state ):
+        if 'final' in dir( self.agent ):
+            self.agent.final( state )
+
+#################
+# Worker side   #
+#################
+
+_WORKER_OPTIONS = None
+
+def _initWorker( options ):
+    global _WORKER_OPTIONS
+    _WORKER_OPTIONS = options
+    muteWorker()
+
+def _playMatch( job ):
+    """
+    Plays one (agent, layout, ghost, seed) game and returns its result row.
+    Crashes are recorded rather than raised so that one bad agent cannot
+    stop the tournament.  A game that could not be set up (a missing layout
+    or agent) is the harness's fault, not the agent's: its row carries a
+    setupError instead and is not a result.
+    """
+    agentName, layoutName, ghostName, seed = job
+    options = _WORKER_OPTIONS
+    row = {'agent': agentName, 'layout': layoutName, 'ghost': ghostName, 'seed': seed,
+           'iterations': options['iterations'], 'timeout': options['timeout'],
+           'moveTimeout': options['moveTimeout'],
+           'score': 0.0, 'win': False, 'crashed': False, 'moves': 0,
+           'forwardCalls': 0, 'latencies': {}, 'time': 0.0}
+    start = time.time()
+    try:
+        board = loadLayout( layoutName, options['layoutDir'] )
+        agentType = pacman.loadAgent( agentName, True )
+        ghostType = pacman.loadAgent( ghostName, True )
+    except Exception, e:
+        row['setupError'] = '%s: %s' % (e.__class__.__name__, e)
+        return row
+    hosted = None
+    try:
+        random.seed( seed )
+        if options['isolate']:
+            hosted = agentHost.HostedAgent( agentType, maxMemory=options['agentMemory'] )
+            agent = MeasuredAgent( hosted )
+        else:
+            agent = MeasuredAgent( agentType() )
+        ghosts = [ghostType( i+1 ) for i in range( options['numGhosts'] )]
+        rules = pacman.ClassicGameRules( options['timeout'], options['moveTimeout'], None,
+                                         options['iterations'], options['timeout'] )
+        game = rules.newGame( board, agent, ghosts, textDisplay.NullGraphics(), True, options['catchExceptions'] )
+        game.run()
+        row['score'] = game.state.getScore()
+        row['win'] = game.state.isWin()
+        row['crashed'] = game.agentCrashed
+        row['moves'] = agent.numMoves
+        row['forwardCalls'] = agent.forwardCalls
+        row['latencies'] = agent.latencies
+    except Exception, e:
+        row['crashed'] = True
+        row['error'] = '%s: %s' % (e.__class__.__name__, e)
+    if hosted != None: hosted.stop()
+    row['time'] = time.time() - start
+    return row
+
+#################
+# Driver side   #
+#################
+
+def jobKey( row ):
+    """
+    Identifies a game in the log.  The budgets are part of the key, so
+    rerunning with other -i or timeouts plays the games again rather than
+    resuming results measured under different limits.
+    """
+    return (row['agent'], row['layout'], row['ghost'], row['seed'],
+            row.get('iterations'), row.get('timeout'), row.get('moveTimeout'))
+
+def readLog( logName ):
+    """
+    Returns the result rows already in a tournament log (empty if missing).
+    A partly written last line from an interrupted run is ignored.
+    """
+    rows = []
+    if not os.path.exists( logName ): return rows
+    f = open( logName )
+    try:
+        for line in f:
+            try: rows.append( json.loads( line ) )
+            except ValueError: pass
+    finally: f.close()
+    for row in rows:
+        row['latencies'] = dict( [(int(k), v) for k, v in row['latencies'].items()] )
+    return rows
+
+def runTournament( agents, layouts, ghosts, seeds, options, logName, workers ):
+    """
+    Plays every game of the cross product that is not in the log yet and
+    returns the rows of the log that belong to it.  Games that could not be
+    set up are reported but not logged, so a fixed command line retries them.
+    """
+    limits = (options['iterations'], options['timeout'], options['moveTimeout'])
+    allJobs = [(a, l, g, s) for a in agents for l in layouts for g in ghosts for s in seeds]
+    wanted = set( [job + limits for job in allJobs] )
+    rows = [row for row in readLog( logName ) if jobKey( row ) in wanted]
+    done = set( [jobKey( row ) for row in rows] )
+    jobs = [job for job in allJobs if job + limits not in done]
+    print 'Tournament: %d games, %d already played, %d to go on %d workers' % (len(allJobs), len(allJobs) - len(jobs), len(jobs), workers)
+    if len( jobs ) == 0: return rows
+
+    log = open( logName, 'a' )
+    setupErrors = []
+    def onRow( i, row ):
+        description = '%s on %s vs %s (seed %d)' % (row['agent'], row['layout'], row['ghost'], row['seed'])
+        if 'setupError' in row:
+            setupErrors.append( row )
+            print '[%d/%d] %s: not played, %s' % (i + 1, len( jobs ), description, row['setupError'])
+            return
+        log.write( json.dumps( row ) + '\n' )
+        log.flush()
+        rows.append( row )
+        printProgress( i, len( jobs ), description, row )
+    try:
+        playGames( _playMatch, jobs, workers, _initWorker, (options,), onRow )
+    finally:
+        log.close()
+    if len( setupErrors ) > 0:
+        print '%d games could not be set up and were not played' % len( setupErrors )
+    return rows
+
+def summarize( rows ):
+    """
+    Aggregates result rows into one entry per (agent, layout).
+    """
+    table = []
+    for entry, group in summarizeGames( rows, ['agent', 'layout'] ):
+        entry['forwardCalls'] = sum( [row['forwardCalls'] for row in group] )
+        entry['callsPerMove'] = entry['forwardCalls'] / float( max( entry['moves'], 1 ) )
+        table.append( entry )
+    return table
+
+COLUMNS = [('agent', '%-24s', '%-24s'), ('layout', '%-18s', '%-18s'), ('games', '%6s', '%6d'),
+           ('meanScore', '%10s', '%10.1f'), ('winRate', '%8s', '%8.2f'), ('crashes', '%8s', '%8d'),
+           ('p50', '%10s', '%10.2f'), ('p99', '%10s', '%10.2f'), ('callsPerMove', '%13s', '%13.1f')]
+
+def writeTable( table, fileName ):
+    import csv
+    f = open( fileName, 'wb' )
+    try:
+        writer = csv.writer( f )
+        names = ['agent', 'layout', 'games', 'meanScore', 'winRate', 'crashes', 'p50', 'p99', 'forwardCalls', 'callsPerMove']
+        writer.writerow( names )
+        for entry in table:
+            writer.writerow( [entry[name] for name in names] )
+    finally: f.close()
+
+def readCommand( argv ):
+    from optparse import OptionParser
+    parser = OptionParser( __doc__ )
+    default = pacman.default
+    parser.add_option('-p', '--pacman', dest='pacman',
+                      help=default('Comma separated agent TYPEs from any *Agents.py to enter'), default='CompetitionAgent')
+    parser.add_option('-l', '--layouts', dest='layouts',
+                      help=default('Comma separated LAYOUTs, or "all" for every layout in the layout directory'), default='all')
+    parser.add_option('--layoutDir', dest='layoutDir',
+                      help=default('Directory holding the .lay files'), default='layouts')
+    parser.add_option('-g', '--ghosts', dest='ghosts',
+                      help=default('Comma separated ghost agent TYPEs'), default='RandomGhost,DirectionalGhost')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts',
+                      help=default('The maximum number of ghosts to use'), default=4)
+    parser.add_option('-s', '--seeds', type='int', dest='seeds',
+                      help=default('Number of seeds (games) per agent, layout and ghost type'), default=20)
+    parser.add_option('--firstSeed', type='int', dest='firstSeed',
+                      help=default('First seed; seeds are consecutive'), default=0)
+    parser.add_option('-i', '--iterations', dest='iterations', type='int',
+                      help=default('Maximum length of forward model steps'), default=500)
+    parser.add_option('--timeout', dest='timeout', type='float',
+                      help=default('Maximum length of time a game can last'), default=30)
+    parser.add_option('--moveTimeout', dest='moveTimeout', type='float',
+                      help='Maximum seconds an agent can spend on a single move with -c [Default: --timeout]', default=None)
+    parser.add_option('-c', '--catchExceptions', action='store_true', dest='catchExceptions',
+                      help='Turns on exception handling and timeouts during games', default=False)
+    parser.add_option('--isolate', action='store_true', dest='isolate',
+                      help='Run each agent in its own process, so a runaway agent is killed rather than the worker', default=False)
+    parser.add_option('--agentMemory', dest='agentMemory', type='int',
+                      help='Memory limit in MB for agent processes with --isolate', default=None)
+    parser.add_option('--workers', dest='workers', type='int',
+                      help=default('Number of worker processes'), default=4)
+    parser.add_option('-o', '--output', dest='output',
+                      help=default('Prefix for the game log (PREFIX.games.jsonl) and result table (PREFIX.csv); '
+                                   'an existing game log is resumed'), default='tournament')
+
+    options, otherjunk = parser.parse_args( argv )
+    if len( otherjunk ) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options, listLayouts( options.layouts, options.layoutDir )
+
+if __name__ == '__main__':
+    options, layouts = readCommand( sys.argv[1:] )
+    workerOptions = {'layoutDir': options.layoutDir, 'numGhosts': options.numGhosts, 'iterations': options.iterations,
+                     'timeout': options.timeout, 'moveTimeout': options.moveTimeout,
+                     'isolate': options.isolate, 'agentMemory': options.agentMemory,
+                     'catchExceptions': options.catchExceptions}
+    seeds = range( options.firstSeed, options.firstSeed + options.seeds )
+    rows = runTournament( options.pacman.split(','), layouts, options.ghosts.split(','), seeds,
+                          workerOptions, options.output + '.games.jsonl', options.workers )
+    table = summarize( rows )
+    printTable( table, COLUMNS, '   (p50/p99 in ms)', ['p50', 'p99'] )
+    writeTable( table, options.output + '.csv' )